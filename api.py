@@ -0,0 +1,280 @@
+# Qrauts AG Themensammler – Lesende JSON-API (eigener Prozess, z.B. für interne Auswertungen)
+"""Read-only HTTP JSON API on the app's database layer, run next to the Streamlit server.
+
+    python api.py --port 8510
+
+    GET /api/topics?category=…&author=…&q=…&from=YYYY-MM-DD&to=…&limit=50&cursor=…
+    GET /api/archive?…                    the same filters on the archived topics
+    GET /api/topics/<id>                  one topic (open or archived) with links, updates and comments
+    GET /api/topics.ndjson?…&followups=1  every matching topic, one JSON object per line, streamed
+    GET /api/archive.ndjson?…
+    GET /api/categories
+    GET /api/stats                        dashboard counts and the most/latest active topics
+
+category and author may be repeated; sort=activity orders by the last update/comment. Lists return {"items", "total", "next_cursor"}; pass
+next_cursor back as cursor for the following page (null on the last one). Every response carries
+an ETag taken from the change log, so polling with If-None-Match gets 304 until something was
+written; Accept-Encoding: gzip compresses the bodies."""
+import os, re, sys, json, gzip, zlib, base64, argparse, itertools
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import db
+import snapshot
+from profiling import profiler
+
+API_HOST = os.environ.get("THEMENSAMMLER_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("THEMENSAMMLER_API_PORT", "8510"))
+PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+DUMP_CHUNK = 500       # topics per query of an NDJSON dump
+GZIP_MIN_BYTES = 1024  # smaller bodies are not worth compressing
+GZIP_LEVEL = 6
+
+class ApiError(Exception):
+    def __init__(self, status:HTTPStatus, message:str):
+        super().__init__(message)
+        self.status = status
+
+# ---------- Parameters ----------
+def _one(query:dict, name:str, default:str="") -> str:
+    values = query.get(name)
+    return values[-1] if values else default
+
+def _date(query:dict, name:str) -> date|None:
+    value = _one(query, name)
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name}: Datum als YYYY-MM-DD erwartet") from None
+
+def _flag(query:dict, name:str) -> bool:
+    return _one(query, name).lower() in ("1", "true", "yes", "ja")
+
+SORT_ORDERS = {"": None, "created": None, "activity": "activity"}
+
+def _filters(query:dict, archived:bool) -> dict:
+    """The sidebar filters of the app (see db._topics_query) from query parameters."""
+    sort = _one(query, "sort")
+    if sort not in SORT_ORDERS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"sort: {' oder '.join(o for o in SORT_ORDERS if o)}")
+    return {"categories": query.get("category", []), "users": query.get("author", []), "q": _one(query, "q"),
+            "date_from": _date(query, "from"), "date_to": _date(query, "to"), "archived_only": archived,
+            "order": SORT_ORDERS[sort]}
+
+def encode_cursor(cursor:tuple|None) -> str|None:
+    """Opaque form of a (sort key, id) cursor for URLs."""
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode().rstrip("=")
+
+def decode_cursor(text:str) -> tuple|None:
+    if not text:
+        return None
+    try:
+        value = json.loads(base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)))
+        if not isinstance(value, list) or len(value) != 2:
+            raise ValueError
+        key, tid = value
+        if not (key is None or isinstance(key, (int, float))) or not isinstance(tid, int) or isinstance(tid, bool):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "cursor: ungültig (next_cursor der vorigen Seite übergeben)") from None
+    return key, tid
+
+# ---------- Resources ----------
+def _topic(row, snippet:str|None=None) -> dict:
+    tid, title, desc, cat, author, created_at, archived_at = row[:7]
+    item = {"id": tid, "title": title, "description": desc, "category": cat, "author": author,
+            "created_at": created_at, "archived_at": archived_at}
+    if snippet is not None:
+        item["snippet"] = snippet
+    return item
+
+def _followups(details:dict) -> dict:
+    return {"links": details["links"],
+            **{kind: [{"user": u, "content": c, "created_at": at} for u, c, at in details[kind]]
+               for kind in ("updates", "comments")}}
+
+def list_page(query:dict, archived:bool) -> dict:
+    try:
+        limit = int(_one(query, "limit", str(PAGE_LIMIT)))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"limit: 1 bis {MAX_PAGE_LIMIT}")
+    rows, next_cursor, total = snapshot.snapshot.page_rows(_filters(query, archived), limit, decode_cursor(_one(query, "cursor")))
+    return {"items": [_topic(r, r[-1]) for r in rows], "total": total, "next_cursor": encode_cursor(next_cursor)}
+
+def topic_detail(topic_id:int) -> dict:
+    rows = db.get_topics([topic_id])
+    if not rows:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"Thema {topic_id} nicht gefunden")
+    return {**_topic(rows[0]), **_followups(db.load_followups([topic_id])[topic_id])}
+
+STATS_TOP = 10
+
+def stats() -> dict:
+    counts = db.topic_counts()
+    return {"total": counts["all"].get(None, {"open": 0, "archived": 0}),
+            **{dim: [{"key": key, **c} for key, c in sorted(counts[dim].items(), key=lambda kv: kv[0] or "")]
+               for dim in ("category", "author", "month")},
+            "most_active": db.topic_activity("total", STATS_TOP), "last_active": db.topic_activity("last", STATS_TOP)}
+
+def iter_dump(query:dict, archived:bool):
+    """NDJSON lines of every matching topic in listing order, DUMP_CHUNK topics per query."""
+    ids = snapshot.list_topic_ids(_filters(query, archived))
+    followups = _flag(query, "followups")
+    # Uncached loaders, as in the exports: a dump must not flush the read cache of the polling clients
+    load = db.load_followups.__wrapped__ if followups else db.load_links.__wrapped__
+    for i in range(0, len(ids), DUMP_CHUNK):
+        chunk = ids[i:i + DUMP_CHUNK]
+        details = load(chunk)
+        yield "".join(json.dumps({**_topic(row), **(_followups(details[row[0]]) if followups else {"links": details[row[0]]})},
+                                 ensure_ascii=False) + "\n"
+                      for row in db.get_topics.__wrapped__(chunk)).encode()
+
+ROUTES = [  # (pattern, handler(match, query) -> dict); the DUMPS paths stream instead
+    (re.compile(r"/api/topics"), lambda m, q: list_page(q, False)),
+    (re.compile(r"/api/archive"), lambda m, q: list_page(q, True)),
+    (re.compile(r"/api/topics/(\d+)"), lambda m, q: topic_detail(int(m[1]))),
+    (re.compile(r"/api/categories"), lambda m, q: {"items": db.get_categories()}),
+    (re.compile(r"/api/stats"), lambda m, q: stats()),
+]
+DUMPS = {"/api/topics.ndjson": False, "/api/archive.ndjson": True}
+
+def _route(path:str):
+    for pattern, handler in ROUTES:
+        if m := pattern.fullmatch(path):
+            return handler, m
+    raise ApiError(HTTPStatus.NOT_FOUND, f"Unbekannter Pfad: {path}")
+
+@db.cached
+def render(path:str, query:dict) -> tuple[bytes, bytes|None]:
+    """JSON body of a GET and its gzip form (None if too small), cached until the next write."""
+    handler, m = _route(path)
+    body = json.dumps(handler(m, query), ensure_ascii=False, separators=(",", ":")).encode()
+    return body, gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_BYTES else None
+
+@db.cached
+def etag() -> str:
+    """Validator of every resource: the change-log position. It survives restarts (unlike the
+    per-process data version) and moves with every write to topics, follow-ups, links and categories."""
+    return f'W/"{db.change_seq()}"'
+
+# ---------- HTTP ----------
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: polling clients reuse their connection
+    disable_nagle_algorithm = True  # headers and body are separate writes; do not hold the body back for an ACK
+    server_version = "ThemensammlerAPI"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        query = parse_qs(url.query)
+        with profiler.span("api." + re.sub(r"\d+", "<id>", path)):
+            try:
+                if path not in DUMPS:
+                    _route(path)
+                tag = etag()
+                if self._not_modified(tag):
+                    self._respond(HTTPStatus.NOT_MODIFIED, b"", etag=tag)
+                elif path in DUMPS:
+                    self._stream(iter_dump(query, DUMPS[path]), tag)
+                else:
+                    body, gz = render(path, query)
+                    self._respond(HTTPStatus.OK, body, gz, etag=tag)
+            except ApiError as e:
+                self._error(e.status, str(e))
+            except Exception as e:
+                self.log_error("%s: %s", type(e).__name__, e)
+                self._error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+
+    def _not_modified(self, tag:str) -> bool:
+        sent = self.headers.get("If-None-Match")
+        return bool(sent) and (sent.strip() == "*" or tag in (t.strip() for t in sent.split(",")))
+
+    def _gzip(self) -> bool:
+        return "gzip" in self.headers.get("Accept-Encoding", "")
+
+    def _respond(self, status:HTTPStatus, body:bytes, gz:bytes|None=None, etag:str|None=None,
+                 content_type:str="application/json; charset=utf-8"):
+        self.send_response(status)
+        if gz is not None and self._gzip():
+            body = gz
+            self.send_header("Content-Encoding", "gzip")
+        if status != HTTPStatus.NOT_MODIFIED:  # a 304 has no body, nor headers describing one
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # may be stored, but revalidated on every use
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status:HTTPStatus, message:str):
+        self._respond(status, json.dumps({"error": message}, ensure_ascii=False).encode())
+
+    def _stream(self, chunks, tag:str):
+        """Chunked NDJSON response; the body is produced (and compressed) as it is sent."""
+        first = next(chunks, b"")  # errors in the parameters still get a proper status
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", tag)
+        self.send_header("Cache-Control", "no-cache")
+        z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if self._gzip() else None  # wbits 31: gzip framing
+        if z:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        try:
+            for data in itertools.chain([first], chunks):
+                self._chunk(z.compress(data) if z else data)
+            if z:
+                self._chunk(z.flush())
+            self.wfile.write(b"0\r\n\r\n")
+        except Exception as e:
+            # The status is out already: drop the connection, the client sees a truncated body
+            self.close_connection = True
+            self.log_error("dump abgebrochen: %s: %s", type(e).__name__, e)
+
+    def _chunk(self, data:bytes):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def log_message(self, format, *args):
+        # Per-request logging would cost more than a cached response; errors still go to log_error
+        pass
+
+    def log_error(self, format, *args):
+        sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+def make_server(host:str=API_HOST, port:int=API_PORT) -> ApiServer:
+    """Bound server with the topic snapshot loaded, so the first request does not pay for it."""
+    snapshot.snapshot.columns()
+    return ApiServer((host, port), ApiHandler)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="api.py", description=f"{db.APP_TITLE} – lesende JSON-API")
+    ap.add_argument("--host", default=API_HOST, help="Adresse (Standard: nur lokal)")
+    ap.add_argument("--port", type=int, default=API_PORT)
+    args = ap.parse_args(argv)
+    server = make_server(args.host, args.port)
+    print(f"{db.APP_TITLE} API: http://{args.host}:{server.server_address[1]}/api/topics", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
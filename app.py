@@ -1,24 +1,26 @@
 # Qrauts AG Themensammler – mit Archiv & Import
 import streamlit as st
-import sqlite3, json, re, io, random, requests
+from streamlit.errors import StreamlitAPIException
+import os, re, random
 import pandas as pd
 from datetime import datetime, date
-from zoneinfo import ZoneInfo
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.lib import utils
-
-APP_TITLE = "Qrauts AG Themensammler"
-USERS = ["Marek", "Annika", "Kurt", "Gerd"]
-DEFAULT_CATEGORIES = ["Wohnungswirtschaft", "Privatpersonen", "Leuchtturmprojekte", "Cashflowprojekte"]
-TZ = ZoneInfo("Europe/Berlin")
-DB_PATH = "themensammler.db"
+
+from db import (APP_TITLE, USERS, DEFAULT_CATEGORIES, TZ, get_categories, add_category, delete_category,
+                set_setting, get_setting, create_topic, update_topic_category, add_link_to_topic, add_update,
+                add_comment, archive_topic, restore_topic, get_topics, load_followups, topic_counts, topic_activity,
+                TOPIC_FRAME_COLS, read_cache, DB_PATH, ARCHIVE_DB_PATH, MAINTENANCE_KEY)
+from exports import cached_export_pdf, export_cache
+from snapshot import list_topic_ids, list_topics_page
+from profiling import profiler
+from jobs import job_queue, stage_upload, ACTIVE
 
 st.set_page_config(page_title=APP_TITLE, layout="wide")
+_rerun_mark = profiler.clock()
 
 # ---------- Styling & Background Animations (Windräder + Pferde) ----------
-def inject_theme_and_animations():
+# The markup is built once per session (the horses stay where they are across reruns); a rerun only
+# re-sends the cached string.
+def theme_markup() -> str:
     html = r'''
     <style>
       :root{
@@ -70,65 +72,14 @@ def inject_theme_and_animations():
         emoji = random.choice(emojis)
         horses_tags.append(f'<span class="horse" style="animation-delay:{delay:.2f}s; animation-duration:{dur:.2f}s; font-size:{size}px; bottom:{bottom}px">{emoji}</span>')
     horses_html = '<div class="eco-horses">' + ''.join(horses_tags) + '</div>'
-    st.markdown(html + horses_html, unsafe_allow_html=True)
+    return html + horses_html
 
-inject_theme_and_animations()
+def inject_theme_and_animations():
+    if "_theme_html" not in st.session_state:
+        st.session_state["_theme_html"] = theme_markup()
+    st.markdown(st.session_state["_theme_html"], unsafe_allow_html=True)
 
-# ---------- Database ----------
-def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
-
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    # Settings
-    cur.execute("""CREATE TABLE IF NOT EXISTS settings(
-        key TEXT PRIMARY KEY,
-        value TEXT
-    );""")
-    # Categories
-    cur.execute("""CREATE TABLE IF NOT EXISTS categories(
-        name TEXT PRIMARY KEY
-    );""")
-    # Topics
-    cur.execute("""CREATE TABLE IF NOT EXISTS topics(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        category TEXT,
-        created_by TEXT,
-        created_at TEXT,
-        links TEXT DEFAULT '[]',
-        archived_at TEXT,
-        FOREIGN KEY(category) REFERENCES categories(name) ON UPDATE CASCADE ON DELETE SET NULL
-    );""")
-    # Updates
-    cur.execute("""CREATE TABLE IF NOT EXISTS updates(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        topic_id INTEGER,
-        user TEXT,
-        content TEXT,
-        created_at TEXT,
-        FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
-    );""")
-    # Comments
-    cur.execute("""CREATE TABLE IF NOT EXISTS comments(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        topic_id INTEGER,
-        user TEXT,
-        content TEXT,
-        created_at TEXT,
-        FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
-    );""")
-    # Seed default categories
-    for cat in DEFAULT_CATEGORIES:
-        cur.execute("INSERT OR IGNORE INTO categories(name) VALUES(?)", (cat,))
-    conn.commit()
-    return conn
-
-conn = init_db()
+inject_theme_and_animations()
 
 # ---------- Helpers ----------
 def fmt_dt(ts:str):
@@ -139,171 +90,101 @@ def fmt_dt(ts:str):
     except Exception:
         return ts
 
-def now_iso():
-    return datetime.now(TZ).isoformat(timespec="seconds")
-
 def valid_url(url:str)->bool:
     return bool(re.match(r"^https?://", url.strip()))
 
-def get_categories():
-    return [r[0] for r in conn.execute("SELECT name FROM categories ORDER BY name ASC")]
-
-def add_category(name:str):
-    name = name.strip()
-    if not name: return
-    conn.execute("INSERT OR IGNORE INTO categories(name) VALUES(?)", (name,))
-    conn.commit()
-
-def delete_category(name:str):
-    conn.execute("DELETE FROM categories WHERE name = ?", (name,))
-    conn.commit()
-
-def set_setting(key:str, value:str):
-    conn.execute("INSERT INTO settings(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, value))
-    conn.commit()
-
-def get_setting(key:str, default:str=""):
-    row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
-    return row[0] if row else default
-
-def create_topic(title, description, category, created_by, links):
-    created_at = now_iso()
-    links_json = json.dumps(links, ensure_ascii=False)
-    cur = conn.cursor()
-    cur.execute("""INSERT INTO topics(title, description, category, created_by, created_at, links)
-                   VALUES(?,?,?,?,?,?)""", (title, description, category, created_by, created_at, links_json))
-    conn.commit()
-    return cur.lastrowid
-
-def update_topic_category(topic_id:int, category:str):
-    conn.execute("UPDATE topics SET category=? WHERE id=?", (category, topic_id))
-    conn.commit()
-
-def add_link_to_topic(topic_id:int, url:str, label:str):
-    row = conn.execute("SELECT links FROM topics WHERE id=?", (topic_id,)).fetchone()
-    links = []
-    if row and row[0]:
-        try:
-            links = json.loads(row[0])
-        except:
-            links = []
-    links.append({"label":label.strip() or url.strip(), "url":url.strip()})
-    conn.execute("UPDATE topics SET links=? WHERE id=?", (json.dumps(links, ensure_ascii=False), topic_id))
-    conn.commit()
-
-def add_update(topic_id:int, user:str, content:str):
-    conn.execute("""INSERT INTO updates(topic_id,user,content,created_at)
-                    VALUES(?,?,?,?)""", (topic_id, user, content, now_iso()))
-    conn.commit()
-
-def add_comment(topic_id:int, user:str, content:str):
-    conn.execute("""INSERT INTO comments(topic_id,user,content,created_at)
-                    VALUES(?,?,?,?)""", (topic_id, user, content, now_iso()))
-    conn.commit()
-
-def archive_topic(topic_id:int, user:str):
-    conn.execute("UPDATE topics SET archived_at=? WHERE id=?", (now_iso(), topic_id))
-    conn.commit()
-
-def restore_topic(topic_id:int):
-    conn.execute("UPDATE topics SET archived_at=NULL WHERE id=?", (topic_id,))
-    conn.commit()
-
-def list_topics(filters:dict):
-    q = "SELECT id, title, description, category, created_by, created_at, links, archived_at FROM topics WHERE 1=1"
-    params = []
-    if filters.get("categories"):
-        q += " AND category IN ({})".format(",".join(["?"]*len(filters["categories"])))
-        params += filters["categories"]
-    if filters.get("users"):
-        q += " AND created_by IN ({})".format(",".join(["?"]*len(filters["users"])))
-        params += filters["users"]
-    if filters.get("q"):
-        q += " AND (LOWER(title) LIKE ? OR LOWER(description) LIKE ?)"
-        s = f"%{filters['q'].lower()}%"
-        params += [s,s]
-    if filters.get("date_from"):
-        q += " AND date(created_at) >= date(?)"
-        params.append(filters["date_from"].isoformat())
-    if filters.get("date_to"):
-        q += " AND date(created_at) <= date(?)"
-        params.append(filters["date_to"].isoformat())
-    # Archived handling
-    if filters.get("archived_only"):
-        q += " AND archived_at IS NOT NULL"
-    else:
-        q += " AND archived_at IS NULL"
-    q += " ORDER BY datetime(created_at) DESC"
-    rows = conn.execute(q, params).fetchall()
-    cols = ["id","Titel","Beschreibung","Kategorie","Autor","Erstellt am","Links","archived_at"]
-    df = pd.DataFrame(rows, columns=cols)
-    return df
-
-def build_pdf(selected_ids:list[int]) -> bytes:
-    if not selected_ids:
-        ids = [r[0] for r in conn.execute("SELECT id FROM topics ORDER BY datetime(created_at) DESC").fetchall()]
-    else:
-        ids = selected_ids
-
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    margin = 2*cm
-    y = height - margin
-
-    def write_line(text, font="Helvetica", size=10, leading=12):
-        nonlocal y
-        c.setFont(font, size)
-        wrapped = utils.simpleSplit(text, font, size, width - 2*margin)
-        for line in wrapped:
-            if y < margin + leading:
-                c.showPage()
-                y = height - margin
-                c.setFont(font, size)
-            c.drawString(margin, y, line)
-            y -= leading
-
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, y, f"{APP_TITLE} – Export")
-    y -= 18
-    c.setFont("Helvetica", 9)
-    c.drawString(margin, y, f"Erstellt am: {datetime.now(TZ).strftime('%Y-%m-%d %H:%M:%S %Z')} | Anzahl Themen: {len(ids)}")
-    y -= 16
-    c.line(margin, y, width - margin, y)
-    y -= 14
-
-    for tid in ids:
-        row = conn.execute("SELECT id, title, description, category, created_by, created_at, links FROM topics WHERE id=?", (tid,)).fetchone()
-        if not row: continue
-        (tid, title, desc, cat, author, created_at, links_json) = row
-
-        c.setFont("Helvetica-Bold", 12)
-        write_line(f"#{tid}  {title}", "Helvetica-Bold", 12, 14)
-        write_line(f"Rubrik: {cat}   |   Autor: {author}   |   Eröffnung: {created_at}", "Helvetica", 9, 12)
-        if desc:
-            write_line("Beschreibung:", "Helvetica-Bold", 10, 12)
-            write_line(desc, "Helvetica", 10, 12)
-        try:
-            links = json.loads(links_json) if links_json else []
-        except:
-            links = []
-        if links:
-            write_line("Links:", "Helvetica-Bold", 10, 12)
-            for l in links:
-                write_line(f"• {l.get('label')}: {l.get('url')}", "Helvetica", 9, 12)
-        y -= 6
-        c.setStrokeColorRGB(0.7,0.82,0.74)
-        c.line(margin, y, width - margin, y)
-        y -= 16
-        c.setStrokeColorRGB(0,0,0)
-
-    c.save()
-    buffer.seek(0)
-    return buffer.getvalue()
+def offer_download(container, label:str, path:str, file_name:str, key:str|None=None):
+    """Download button fed from an (export cache) file on disk."""
+    with open(path, "rb") as fh:
+        container.download_button(label, data=fh, file_name=file_name, key=key)
+
+def topic_page(key:str, filters:dict):
+    """Current page of a topic listing. The keyset cursors of the pages visited so far are kept
+    in the session, so paging back and forth never re-reads earlier pages; they are reset
+    whenever the filters change."""
+    state = st.session_state.get(f"_pages_{key}")
+    if not state or state["filters"] != filters:
+        state = {"filters": filters, "cursors": [None]}
+        st.session_state[f"_pages_{key}"] = state
+    df, next_cursor = list_topics_page(filters, st.session_state.get("_page_size", 50), state["cursors"][-1])
+    return df, next_cursor, state
+
+def page_nav(key:str, state:dict, next_cursor):
+    if len(state["cursors"]) == 1 and next_cursor is None:
+        return
+    c1, c2, c3 = st.columns([1,3,1])
+    with c1:
+        st.button("◀ Zurück", key=f"prev_{key}", disabled=len(state["cursors"]) == 1, on_click=state["cursors"].pop)
+    with c2:
+        st.caption(f"Seite {len(state['cursors'])}")
+    with c3:
+        st.button("Weiter ▶", key=f"next_{key}", disabled=next_cursor is None, on_click=state["cursors"].append, args=(next_cursor,))
+
+# ---------- Background jobs ----------
+# Exports, the import and the archive sync run as jobs (jobs.py) outside the Streamlit process.
+# The session remembers its job ids; the sidebar panel polls them while any is active.
+JOB_POLL_SECONDS = 2
+JOB_LABELS = {"pdf": "PDF-Export", "import": "Excel-Import", "archive_export": "Archiv erzeugen", "archive_sync": "Von GitHub laden",
+              "maintenance": "Datenbank-Wartung"}
+
+if "_jobs" not in st.session_state:
+    st.session_state["_jobs"] = []
+
+def submit_job(kind:str, params:dict):
+    jid = job_queue.submit(kind, params, st.session_state.get("current_user"))
+    if jid not in st.session_state["_jobs"]:
+        st.session_state["_jobs"].append(jid)
+    st.session_state["_jobs_polling"] = True
+
+def show_job(job:dict):
+    label = f"#{job['id']} {JOB_LABELS.get(job['kind'], job['kind'])}"
+    res = job["result"]
+    if job["status"] in ACTIVE:
+        st.progress(job["progress"] or 0.0, text=f"{label} – {'wartet' if job['status'] == 'queued' else 'läuft'} …")
+    elif job["status"] == "failed":
+        st.error(f"{label} fehlgeschlagen: {job['error']}")
+    elif job["kind"] == "pdf":
+        if os.path.exists(res["path"]):
+            name = "themensammler_auswahl.pdf" if job["params"]["ids"] else "themensammler_alle.pdf"
+            offer_download(st, f"📥 {label}: {name}", res["path"], name, key=f"job_dl_{job['id']}")
+        else:
+            st.caption(f"{label}: Datei nicht mehr im Export-Cache, bitte neu exportieren.")
+    elif job["kind"] == "import":
+        st.success(f"{label}: {res['imported']} Themen importiert.")
+        if res["duplicates"] or res["categories_added"]:
+            st.caption(f"Übersprungene Duplikate: {res['duplicates']} | Neue Rubriken: {res['categories_added']}")
+    elif job["kind"] == "archive_export":
+        if res["new"] or res.get("removed") or res["full"]:
+            detail = f"{res['new']} Themen" if res["full"] else f"{res['new']} neu, {res['removed']} entfernt"
+            st.success(f"{label}: archiv.xlsx erzeugt ({detail}). Bitte manuell ins Repo committen/pushen.")
+        else:
+            st.info(f"{label}: archiv.xlsx ist bereits aktuell.")
+    elif job["kind"] == "archive_sync":
+        if res["changed"]:
+            st.success(f"{label}: archiv.xlsx lokal aktualisiert, {res['import']['imported']} fehlende Themen übernommen.")
+        else:
+            st.info(f"{label}: archiv.xlsx ist unverändert.")
+    elif job["kind"] == "maintenance":
+        mb = lambda sizes: sum(sizes.values()) / 2**20
+        st.success(f"{label}: {mb(res['before']):.1f} MB → {mb(res['after']):.1f} MB.")
+
+def jobs_panel():
+    jobs = job_queue.get(st.session_state["_jobs"])
+    for job in reversed(jobs):
+        show_job(job)
+    if any(j["status"] not in ACTIVE for j in jobs) and st.button("Erledigte ausblenden", key="jobs_clear"):
+        st.session_state["_jobs"] = [j["id"] for j in jobs if j["status"] in ACTIVE]
+        st.rerun()
+    if st.session_state.get("_jobs_polling") and not any(j["status"] in ACTIVE for j in jobs):
+        st.session_state["_jobs_polling"] = False
+        st.rerun()  # full rerun: show what the jobs changed and stop polling
 
 # ---------- Sidebar ----------
+SORT_ORDERS = {"Eröffnung (neueste zuerst)": None, "Letzte Aktivität": "activity"}
+
+_sidebar_mark = profiler.clock()
 st.sidebar.title("⚙️ Einstellungen & Export")
-current_user = st.sidebar.selectbox("Ich bin:", USERS, index=0)
+current_user = st.sidebar.selectbox("Ich bin:", USERS, index=0, key="current_user")
 
 with st.sidebar.expander("Kategorien verwalten", expanded=False):
     st.caption("Standard: " + ", ".join(DEFAULT_CATEGORIES))
@@ -321,14 +202,16 @@ with st.sidebar.expander("Kategorien verwalten", expanded=False):
 with st.sidebar.expander("🔎 Filter", expanded=False):
     fcats = st.multiselect("Rubriken", options=get_categories())
     fusers = st.multiselect("Autoren", options=USERS)
-    q = st.text_input("Suche (Titel/Beschreibung)")
+    q = st.text_input("Suche (Titel, Beschreibung, Updates, Kommentare)")
     c1, c2 = st.columns(2)
     with c1:
         dfrom = st.date_input("Von (inkl.)", value=None)
     with c2:
         dto = st.date_input("Bis (inkl.)", value=None)
     show_archived = st.checkbox("Nur archivierte anzeigen")
-    st.session_state["_filters"] = {"categories": fcats, "users": fusers, "q": q, "date_from": dfrom or None, "date_to": dto or None, "archived_only": show_archived}
+    sort_label = st.selectbox("Sortierung", list(SORT_ORDERS), help="Mit Suchbegriff sortiert „Eröffnung“ nach Relevanz.")
+    st.selectbox("Themen pro Seite", [25, 50, 100, 200], index=1, key="_page_size")
+    st.session_state["_filters"] = {"categories": fcats, "users": fusers, "q": q, "date_from": dfrom or None, "date_to": dto or None, "archived_only": show_archived, "order": SORT_ORDERS[sort_label]}
 
 with st.sidebar.expander("📦 Archiv (Excel)", expanded=False):
     gh_url = st.text_input("GitHub RAW-URL der Archiv-Excel (optional)", value=get_setting("archive_excel_url",""), placeholder="https://raw.githubusercontent.com/<user>/<repo>/<branch>/qrauts_themensammler/archiv.xlsx")
@@ -338,66 +221,61 @@ with st.sidebar.expander("📦 Archiv (Excel)", expanded=False):
     cA, cB = st.columns(2)
     with cA:
         if st.button("⬇️ Von GitHub laden (READ)") and gh_url:
-            try:
-                r = requests.get(gh_url, timeout=10)
-                r.raise_for_status()
-                open("archiv.xlsx", "wb").write(r.content)
-                st.success("archiv.xlsx lokal aktualisiert.")
-            except Exception as e:
-                st.error(f"Download fehlgeschlagen: {e}")
+            submit_job("archive_sync", {"url": gh_url, "target": os.path.abspath("archiv.xlsx")})
     with cB:
+        arch_full = st.checkbox("Komplett neu aufbauen", help="Sonst werden nur seit dem letzten Export archivierte Themen ergänzt.")
         if st.button("⬇️ Lokales Archiv erzeugen"):
-            try:
-                df_arch = pd.read_sql_query("SELECT id as ID, title as Titel, description as Beschreibung, category as Rubrik, created_by as Autor, created_at as Eroeffnung, archived_at as Archiviert_am, links as Links FROM topics WHERE archived_at IS NOT NULL ORDER BY datetime(archived_at) DESC", conn)
-                df_arch.to_excel("archiv.xlsx", index=False)
-                st.success("archiv.xlsx erzeugt. Bitte manuell ins Repo committen/pushen.")
-            except Exception as e:
-                st.error(f"Excel-Erzeugung fehlgeschlagen: {e}")
+            submit_job("archive_export", {"target": os.path.abspath("archiv.xlsx"), "full": arch_full})
 
 with st.sidebar.expander("📥 Import (Excel)", expanded=False):
     st.caption("Excel-Import: Spalten 'Titel, Beschreibung, Rubrik, Autor, Eroeffnung, Links(JSON optional)'")
     up_xlsx = st.file_uploader("Excel importieren", type=["xlsx"])
     if up_xlsx and st.button("Excel importieren"):
-        try:
-            xdf = pd.read_excel(up_xlsx)
-            req_cols = {"Titel","Beschreibung","Rubrik","Autor","Eroeffnung"}
-            if not req_cols.issubset(set(xdf.columns)):
-                st.error(f"Fehlende Spalten. Erwartet: {', '.join(sorted(req_cols))}")
-            else:
-                imported = 0
-                for _, r in xdf.iterrows():
-                    title = str(r.get("Titel","")).strip()
-                    desc  = str(r.get("Beschreibung","") or "").strip()
-                    cat   = str(r.get("Rubrik","")).strip() or None
-                    author= str(r.get("Autor","")).strip() or USERS[0]
-                    created_at = str(r.get("Eroeffnung","")).strip() or now_iso()
-                    links = []
-                    if "Links" in xdf.columns and pd.notna(r.get("Links")):
-                        try:
-                            links = json.loads(r.get("Links"))
-                        except Exception:
-                            links = []
-                    if title:
-                        tid = create_topic(title, desc, cat, author, links)
-                        conn.execute("UPDATE topics SET created_at=? WHERE id=?", (created_at, tid))
-                        conn.commit()
-                        imported += 1
-                st.success(f"{imported} Themen importiert.")
-        except Exception as e:
-            st.error(f"Excel-Import fehlgeschlagen: {e}")
+        submit_job("import", {"path": stage_upload(up_xlsx.getvalue())})
+
+with st.sidebar.expander("🗄️ Caches & Datenbank", expanded=False):
+    cs = read_cache.stats()
+    st.caption(f"Lese-Cache – Treffer: {cs['hits']} | Fehlgriffe: {cs['misses']} | Trefferquote: {cs['hit_rate']:.0%} | Einträge: {cs['entries']}/{cs['maxsize']}")
+    es = export_cache.stats()
+    st.caption(f"Export-Cache – Treffer: {es['hits']} | Neu erzeugt: {es['misses']}")
+    sizes = {label: os.path.getsize(p) / 2**20 if os.path.exists(p) else 0.0 for label, p in (("Aktiv", DB_PATH), ("Archiv", ARCHIVE_DB_PATH))}
+    st.caption(" | ".join(f"{label}: {mb:.1f} MB" for label, mb in sizes.items())
+               + f" | Letzte Wartung: {fmt_dt(get_setting(MAINTENANCE_KEY, '')) or '–'}")
+    if st.button("🧹 Wartung jetzt (VACUUM/ANALYZE)", use_container_width=True):
+        submit_job("maintenance", {"vacuum": True})
+
+with st.sidebar.expander("⏱️ Messung", expanded=False):
+    profiler.enabled = st.toggle("Messung aktiv", value=profiler.enabled,
+                                 help="Erfasst SQL-Abfragen, Exporte und den Seitenaufbau (für alle Sitzungen dieses Servers).")
+    profiler.slow_ms = st.number_input("Langsame Abfragen ab (ms)", min_value=0.0, value=float(profiler.slow_ms), step=10.0,
+                                       help="Langsamere Abfragen werden mit Abfrageplan protokolliert.")
+    pstats = profiler.stats()
+    if pstats:
+        st.dataframe([{**r, **{k: round(v, 1) for k, v in r.items() if k.endswith("_ms")}} for r in pstats],
+                     hide_index=True, use_container_width=True)
+        if st.button("Messwerte zurücksetzen"):
+            profiler.reset()
+    st.caption(f"Protokoll: {profiler.log_path}")
 
 # Export buttons
 if "selected_ids" not in st.session_state:
     st.session_state["selected_ids"] = set()
+pdf_followups = st.sidebar.checkbox("PDF mit Updates & Kommentaren")
 col_dl1, col_dl2 = st.sidebar.columns(2)
 with col_dl1:
     if st.button("🧾 PDF export (Auswahl)"):
-        pdf = build_pdf(sorted(list(st.session_state["selected_ids"])))
-        st.sidebar.download_button("📥 Download Auswahl.pdf", data=pdf, file_name="themensammler_auswahl.pdf")
+        submit_job("pdf", {"ids": sorted(st.session_state["selected_ids"]) or None, "followups": pdf_followups})
 with col_dl2:
     if st.button("🧾 PDF export (Alle)"):
-        pdf = build_pdf([])
-        st.sidebar.download_button("📥 Download Alle.pdf", data=pdf, file_name="themensammler_alle.pdf")
+        submit_job("pdf", {"ids": None, "followups": pdf_followups})
+
+job_queue.maintain_if_due()
+if st.session_state["_jobs"]:
+    # Poll only while one of this session's jobs is active; the last poll triggers a full rerun
+    st.session_state["_jobs_polling"] = any(j["status"] in ACTIVE for j in job_queue.get(st.session_state["_jobs"]))
+    with st.sidebar.expander("📋 Aufträge", expanded=True):
+        st.fragment(jobs_panel, run_every=JOB_POLL_SECONDS if st.session_state["_jobs_polling"] else None)()
+profiler.since("render.sidebar", _sidebar_mark)
 
 # ---------- Main ----------
 st.title(f"🌿 {APP_TITLE}")
@@ -407,7 +285,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-tab_new, tab_list, tab_arch = st.tabs(["➕ Neues Thema", "📚 Themenübersicht", "📦 Archiv"])
+tab_new, tab_list, tab_arch, tab_dash = st.tabs(["➕ Neues Thema", "📚 Themenübersicht", "📦 Archiv", "📊 Dashboard"])
 
 with tab_new:
     st.subheader("Neues Thema anlegen")
@@ -427,7 +305,7 @@ with tab_new:
             add_more = st.form_submit_button("＋ Mehr Links")
             if add_more:
                 st.session_state.link_rows = int(st.session_state.get("link_rows",1)) + 1
-                st.experimental_rerun()
+                st.rerun()
         links = []
         for i in range(1, st.session_state.link_rows):
             c = st.columns([3,6,1])
@@ -454,129 +332,218 @@ with tab_new:
                     if k.startswith("lbl_") or k.startswith("url_"):
                         del st.session_state[k]
 
-with tab_list:
+# ---------- Topic cards ----------
+# Every card is a fragment: its widgets (open toggle, category, links, forms, archive/restore)
+# rerun only the card itself instead of the whole script. After a write the card is marked dirty
+# and reloads its own row and follow-ups; archived/restored cards collapse to a one-line note
+# until the next full rerun lists them in the other tab.
+def card_state(tid:int, row:dict, followups:dict|None):
+    if st.session_state.pop(f"_dirty_{tid}", False) or followups is None:
+        fresh = get_topics([tid])
+        if fresh:
+            row = {**dict(zip(TOPIC_FRAME_COLS, fresh[0])), "Treffer": row.get("Treffer")}
+        followups = load_followups([tid])[tid]
+    return row, followups
+
+def after_write(tid:int, moved:str|None=None):
+    st.session_state[f"_dirty_{tid}"] = True
+    if moved:
+        st.session_state[moved].add(tid)
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()  # the click arrived with a full rerun (e.g. batched with a sidebar change)
+
+def show_followups(items):
+    for u in items:
+        st.markdown(f"- _{fmt_dt(u[2])}_ – **{u[0]}**: {u[1]}")
+
+def archived_details(tid:int, row:dict, followups:dict, key:str, moved:str):
+    """Read-only body of an archived topic: archived rows live in the cold file and take no
+    follow-ups, links or category changes, only a restore."""
+    links = followups["links"]
+    with st.container(border=True):
+        st.caption(f"Rubrik: {row['Kategorie']} | Autor: {row['Autor']} | Eröffnung: {row['Erstellt am']} | Archiviert: {row['archived_at']}")
+        if links:
+            st.markdown("**Links:**")
+            for l in links:
+                st.markdown(f"• [{l.get('label') or l.get('url')}]({l.get('url')})")
+        st.markdown("---")
+        st.markdown("**Beschreibung**")
+        st.write(row["Beschreibung"] or "—")
+        for label, kind in (("Updates", "updates"), ("Kommentare", "comments")):
+            if followups[kind]:
+                st.markdown(f"**{label}**")
+                show_followups(followups[kind])
+        if st.button("♻️ Wiederherstellen", key=f"{key}_{tid}"):
+            restore_topic(tid)
+            after_write(tid, moved=moved)
+
+@st.fragment
+def topic_card(row:dict, followups:dict|None, user:str):
+    tid = int(row["id"])
+    if tid in st.session_state["_moved_list"]:
+        st.caption(f"📦 #{tid} • {row['Titel']} – {'wiederhergestellt' if row['archived_at'] else 'archiviert'}")
+        return
+    head_cols = st.columns([1,11])
+    with head_cols[0]:
+        checked = st.checkbox("Auswählen", key=f"sel_{tid}", value=(tid in st.session_state['selected_ids']), label_visibility="collapsed")
+        if checked: st.session_state["selected_ids"].add(tid)
+        else: st.session_state["selected_ids"].discard(tid)
+    with head_cols[1]:
+        opened = st.toggle(f"#{tid} • {row['Titel']}", key=f"open_{tid}")
+        if row["Treffer"]:
+            st.caption(f"🔎 {row['Treffer']}")
+    if not opened:
+        return
+    row, followups = card_state(tid, row, followups)
+    if row["archived_at"]:  # listed with "Nur archivierte anzeigen"
+        archived_details(tid, row, followups, "restore_list", "_moved_list")
+        return
+    cat = row["Kategorie"]
+    links = followups["links"]
+    with st.container(border=True):
+        top_cols = st.columns([3,2,2,2])
+        with top_cols[0]:
+            st.markdown(f"**Rubrik:** {cat}")
+            cats_all = get_categories()
+            new_cat = st.selectbox("Rubrik ändern", options=cats_all, index=cats_all.index(cat) if cat in cats_all else 0, key=f"cat_{tid}")
+            if st.button("💾 Speichern", key=f"save_cat_{tid}"):
+                update_topic_category(tid, new_cat)
+                after_write(tid)
+        with top_cols[1]:
+            st.markdown(f"**Autor:** {row['Autor']}")
+            st.caption(f"Eröffnung: {row['Erstellt am']}")
+        with top_cols[2]:
+            st.markdown("**Links:**")
+            if links:
+                for l in links:
+                    st.markdown(f"• [{l.get('label') or l.get('url')}]({l.get('url')})")
+            add_l = st.text_input("Neue URL", key=f"new_url_{tid}", placeholder="https://...")
+            add_l_lbl = st.text_input("Label", key=f"new_url_lbl_{tid}", placeholder="z.B. Ticket, Doku")
+            if st.button("➕ Link hinzufügen", key=f"btn_add_link_{tid}"):
+                if add_l and valid_url(add_l):
+                    add_link_to_topic(tid, add_l, add_l_lbl or add_l)
+                    after_write(tid)
+                else:
+                    st.error("Bitte gültige URL mit http(s):// eingeben.")
+        with top_cols[3]:
+            st.markdown("**Aktionen:**")
+            if st.button("🧾 Nur dieses Thema exportieren (PDF)", key=f"exp_one_{tid}"):
+                offer_download(st, "📥 Download PDF", cached_export_pdf([tid], include_followups=True), f"thema_{tid}.pdf", key=f"dwn_{tid}")
+            if st.button("📦 Archivieren", key=f"arch_{tid}"):
+                archive_topic(tid, user)
+                after_write(tid, moved="_moved_list")
+
+        st.markdown("---")
+        st.markdown("**Beschreibung**")
+        st.write(row["Beschreibung"] or "—")
+
+        st.markdown("**Updates**")
+        show_followups(followups["updates"])
+        with st.form(f"form_up_{tid}", clear_on_submit=True):
+            up_txt = st.text_area("Update hinzufügen", key=f"up_txt_{tid}", height=80, placeholder="Was ist neu?")
+            if st.form_submit_button("✅ Update speichern"):
+                if up_txt.strip():
+                    add_update(tid, user, up_txt.strip())
+                    after_write(tid)
+                else:
+                    st.error("Bitte Inhalt eingeben.")
+
+        st.markdown("**Kommentare**")
+        show_followups(followups["comments"])
+        with st.form(f"form_cm_{tid}", clear_on_submit=True):
+            cm_txt = st.text_area("Kommentar hinzufügen", key=f"cm_txt_{tid}", height=60, placeholder="Gedanke, Frage, Hinweis ...")
+            if st.form_submit_button("💬 Kommentar speichern"):
+                if cm_txt.strip():
+                    add_comment(tid, user, cm_txt.strip())
+                    after_write(tid)
+                else:
+                    st.error("Bitte Inhalt eingeben.")
+
+@st.fragment
+def archive_card(row:dict, followups:dict|None):
+    tid = int(row["id"])
+    if tid in st.session_state["_moved_arch"]:
+        st.caption(f"♻️ #{tid} • {row['Titel']} – wiederhergestellt")
+        return
+    if not st.toggle(f"#{tid} • {row['Titel']}", key=f"open_arch_{tid}"):
+        return
+    row, followups = card_state(tid, row, followups)
+    archived_details(tid, row, followups, "restore", "_moved_arch")
+
+# A full rerun re-lists both tabs, so cards moved by fragment reruns are back in their right place
+st.session_state["_moved_list"] = set()
+st.session_state["_moved_arch"] = set()
+
+with tab_list, profiler.span("render.tab_list"):
     st.subheader("Themenübersicht & Follow-ups")
-    df = list_topics(st.session_state.get("_filters", {}))
+    filters = st.session_state.get("_filters", {})
+    df, next_cursor, pages = topic_page("list", filters)
     if df.empty:
         st.info("Keine Themen gefunden. Lege ein erstes Thema an oder hebe 'Nur archivierte anzeigen' auf.")
     else:
         sel_all = st.checkbox("Alle auswählen / Auswahl zurücksetzen")
         if sel_all:
-            st.session_state["selected_ids"] = set(df["id"].tolist())
-        for _, row in df.iterrows():
-            tid = int(row["id"])
-            title = row["Titel"]
-            cat = row["Kategorie"]
-            author = row["Autor"]
-            created_at = row["Erstellt am"]
-            desc = row["Beschreibung"]
-            links = []
-            try:
-                links = json.loads(row["Links"]) if row["Links"] else []
-            except:
-                links = []
-            with st.expander(f"#{tid} • {title}"):
-                top_cols = st.columns([1,3,2,2,2])
-                with top_cols[0]:
-                    checked = st.checkbox("Auswählen", key=f"sel_{tid}", value=(tid in st.session_state['selected_ids']))
-                    if checked: st.session_state["selected_ids"].add(tid)
-                    else: st.session_state["selected_ids"].discard(tid)
-                with top_cols[1]:
-                    st.markdown(f"**Rubrik:** {cat}")
-                    cats_all = get_categories()
-                    new_cat = st.selectbox("Rubrik ändern", options=cats_all, index=cats_all.index(cat) if cat in cats_all else 0, key=f"cat_{tid}")
-                    if st.button("💾 Speichern", key=f"save_cat_{tid}"):
-                        update_topic_category(tid, new_cat)
-                        st.success("Rubrik aktualisiert")
-                with top_cols[2]:
-                    st.markdown(f"**Autor:** {author}")
-                    st.caption(f"Eröffnung: {created_at}")
-                with top_cols[3]:
-                    st.markdown("**Links:**")
-                    if links:
-                        for l in links:
-                            st.markdown(f"• [{l.get('label') or l.get('url')}]({l.get('url')})")
-                    add_l = st.text_input("Neue URL", key=f"new_url_{tid}", placeholder="https://...")
-                    add_l_lbl = st.text_input("Label", key=f"new_url_lbl_{tid}", placeholder="z.B. Ticket, Doku")
-                    if st.button("➕ Link hinzufügen", key=f"btn_add_link_{tid}"):
-                        if add_l and valid_url(add_l):
-                            add_link_to_topic(tid, add_l, add_l_lbl or add_l)
-                            st.success("Link hinzugefügt")
-                        else:
-                            st.error("Bitte gültige URL mit http(s):// eingeben.")
-                with top_cols[4]:
-                    st.markdown("**Aktionen:**")
-                    if st.button("🧾 Nur dieses Thema exportieren (PDF)", key=f"exp_one_{tid}"):
-                        pdf = build_pdf([tid])
-                        st.download_button("📥 Download PDF", data=pdf, file_name=f"thema_{tid}.pdf", key=f"dwn_{tid}")
-                    if st.button("📦 Archivieren", key=f"arch_{tid}"):
-                        archive_topic(tid, current_user)
-                        st.success("Thema archiviert.")
-                        st.experimental_rerun()
-
-                st.markdown("---")
-                st.markdown("**Beschreibung**")
-                st.write(desc or "—")
-
-                st.markdown("**Updates**")
-                ups = conn.execute("SELECT user, content, created_at FROM updates WHERE topic_id=? ORDER BY datetime(created_at) DESC", (tid,)).fetchall()
-                if ups:
-                    for u in ups:
-                        st.markdown(f"- _{fmt_dt(u[2])}_ – **{u[0]}**: {u[1]}")
-                with st.form(f"form_up_{tid}", clear_on_submit=True):
-                    up_txt = st.text_area("Update hinzufügen", key=f"up_txt_{tid}", height=80, placeholder="Was ist neu?")
-                    if st.form_submit_button("✅ Update speichern"):
-                        if up_txt.strip():
-                            add_update(tid, current_user, up_txt.strip())
-                            st.success("Update gespeichert.")
-                        else:
-                            st.error("Bitte Inhalt eingeben.")
-
-                st.markdown("**Kommentare**")
-                cms = conn.execute("SELECT user, content, created_at FROM comments WHERE topic_id=? ORDER BY datetime(created_at) DESC", (tid,)).fetchall()
-                if cms:
-                    for cmt in cms:
-                        st.markdown(f"- _{fmt_dt(cmt[2])}_ – **{cmt[0]}**: {cmt[1]}")
-                with st.form(f"form_cm_{tid}", clear_on_submit=True):
-                    cm_txt = st.text_area("Kommentar hinzufügen", key=f"cm_txt_{tid}", height=60, placeholder="Gedanke, Frage, Hinweis ...")
-                    if st.form_submit_button("💬 Kommentar speichern"):
-                        if cm_txt.strip():
-                            add_comment(tid, current_user, cm_txt.strip())
-                            st.success("Kommentar gespeichert.")
-                        else:
-                            st.error("Bitte Inhalt eingeben.")
-
-with tab_arch:
+            st.session_state["selected_ids"] = set(list_topic_ids(filters))
+        # Links and follow-ups of the cards that are already open are loaded in one batch
+        open_ids = [int(t) for t in df["id"] if st.session_state.get(f"open_{t}")]
+        followups = load_followups(open_ids)
+        for row in df.to_dict("records"):
+            topic_card(row, followups.get(int(row["id"])), current_user)
+    page_nav("list", pages, next_cursor)
+
+with tab_arch, profiler.span("render.tab_arch"):
     st.subheader("Archivierte Themen")
-    dfA = list_topics({**st.session_state.get("_filters", {}), "archived_only": True})
+    dfA, next_cursorA, pagesA = topic_page("arch", {**st.session_state.get("_filters", {}), "archived_only": True})
     if dfA.empty:
         st.info("Noch keine archivierten Themen.")
     else:
-        for _, row in dfA.iterrows():
-            tid = int(row["id"])
-            title = row["Titel"]
-            cat = row["Kategorie"]
-            author = row["Autor"]
-            created_at = row["Erstellt am"]
-            archived_at = row["archived_at"]
-            desc = row["Beschreibung"]
-            links = []
-            try:
-                links = json.loads(row["Links"]) if row["Links"] else []
-            except:
-                links = []
-            with st.expander(f"#{tid} • {title}"):
-                st.caption(f"Rubrik: {cat} | Autor: {author} | Eröffnung: {created_at} | Archiviert: {archived_at}")
-                if links:
-                    st.markdown("**Links:**")
-                    for l in links:
-                        st.markdown(f"• [{l.get('label') or l.get('url')}]({l.get('url')})")
-                st.markdown("---")
-                st.markdown("**Beschreibung**")
-                st.write(desc or "—")
-                if st.button("♻️ Wiederherstellen", key=f"restore_{tid}"):
-                    restore_topic(tid)
-                    st.success("Thema wiederhergestellt.")
-                    st.experimental_rerun()
+        open_idsA = [int(t) for t in dfA["id"] if st.session_state.get(f"open_arch_{t}")]
+        followupsA = load_followups(open_idsA)
+        for row in dfA.to_dict("records"):
+            archive_card(row, followupsA.get(int(row["id"])))
+    page_nav("arch", pagesA, next_cursorA)
+
+# ---------- Dashboard ----------
+# Everything comes from the trigger-maintained summary tables (db.topic_counts/topic_activity):
+# a few dozen rows per rerun instead of GROUP BYs over all topics and follow-ups.
+DASHBOARD_TOP = 10
+
+def count_frame(counts:dict, dim_label:str, none_label:str):
+    return pd.DataFrame([{dim_label: key or none_label, "Offen": c["open"], "Archiviert": c["archived"]} for key, c in counts.items()],
+                        columns=[dim_label, "Offen", "Archiviert"]).set_index(dim_label)
+
+def activity_frame(order:str):
+    activity = topic_activity(order, DASHBOARD_TOP)
+    topics = {r[0]: r for r in get_topics([a["topic_id"] for a in activity])}
+    return pd.DataFrame([{"#": a["topic_id"], "Titel": topics[a["topic_id"]][1], "Updates": a["updates"], "Kommentare": a["comments"],
+                          "Letzte Aktivität": fmt_dt(a["last_at"]), "Status": "archiviert" if topics[a["topic_id"]][6] else "offen"}
+                         for a in activity if a["topic_id"] in topics])
+
+with tab_dash, profiler.span("render.tab_dash"):
+    st.subheader("Dashboard")
+    counts = topic_counts()
+    total = counts["all"].get(None, {"open": 0, "archived": 0})
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Offen", total["open"])
+    m2.metric("Archiviert", total["archived"])
+    m3.metric("Gesamt", total["open"] + total["archived"])
+    if total["open"] + total["archived"]:
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**Themen je Rubrik**")
+            st.bar_chart(count_frame(counts["category"], "Rubrik", "– ohne Rubrik –"))
+        with c2:
+            st.markdown("**Themen je Autor**")
+            st.bar_chart(count_frame(counts["author"], "Autor", "– unbekannt –"))
+        st.markdown("**Eröffnete Themen je Monat**")
+        st.bar_chart(count_frame(counts["month"], "Monat", "– ohne Datum –").sort_index())
+        a1, a2 = st.columns(2)
+        for col, label, order in ((a1, "Meiste Updates & Kommentare", "total"), (a2, "Zuletzt aktiv", "last")):
+            with col:
+                st.markdown(f"**{label}**")
+                st.dataframe(activity_frame(order), hide_index=True, use_container_width=True)
 
 st.caption("© Qrauts AG – Nachhaltige Energieprojekte strukturiert steuern.")
+profiler.since("render.rerun", _rerun_mark)
@@ -0,0 +1,83 @@
+# Qrauts AG Themensammler – Abgleich mit der Archiv-Excel auf GitHub
+import os, json
+
+import db
+from profiling import profiler
+from importer import import_excel
+
+SYNC_STATE_KEY = "archive_sync_state"
+CHUNK_BYTES = 64 * 1024
+
+_session = None
+
+def get_session():
+    """Process-wide HTTP session: keeps connections to the host alive and retries transient errors."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                              max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+def _load_state(url:str, target:str) -> dict:
+    """Validators of the last download, if it came from url and target is still that file."""
+    try:
+        state = json.loads(db.get_setting(SYNC_STATE_KEY, "") or "{}")
+        st = os.stat(target)
+    except (ValueError, OSError):
+        return {}
+    if state.get("url") != url or state.get("size") != st.st_size or state.get("mtime") != st.st_mtime_ns:
+        return {}
+    return state
+
+@profiler.timed("sync.download")
+def download_archive(url:str, target:str="archiv.xlsx", session=None, timeout:float=10) -> dict:
+    """Conditionally download url to target.
+
+    Sends If-None-Match/If-Modified-Since from the previous download, so an unchanged file costs
+    a single 304 round trip. A changed file is streamed to a temp file next to target and renamed
+    over it atomically. Returns {"changed": bool, "bytes": int}."""
+    session = session or get_session()
+    state = _load_state(url, target)
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    tmp = f"{target}.download{os.getpid()}"
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            return {"changed": False, "bytes": 0}
+        r.raise_for_status()
+        size = 0
+        try:
+            with open(tmp, "wb") as fh:
+                for chunk in r.iter_content(CHUNK_BYTES):
+                    fh.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        st = os.stat(target)
+        db.set_setting(SYNC_STATE_KEY, json.dumps({
+            "url": url, "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+            "size": st.st_size, "mtime": st.st_mtime_ns}))
+    return {"changed": True, "bytes": size}
+
+@profiler.timed("sync.archive")
+def sync_archive(url:str, target:str="archiv.xlsx", session=None, timeout:float=10) -> dict:
+    """Download the archive if it changed and merge its topics that are missing in the database.
+
+    The delta import is the regular bulk import: rows whose (title, created_at) already exist are
+    skipped, the rest is inserted as archived topics. Returns the download result plus the import
+    statistics (None when the file was unchanged)."""
+    res = download_archive(url, target, session, timeout)
+    res["import"] = import_excel(target) if res["changed"] else None
+    return res
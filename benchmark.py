@@ -0,0 +1,419 @@
+# Qrauts AG Themensammler – Benchmarks der Hot Paths auf synthetischen Daten (headless)
+"""Generate a synthetic database and time the app's hot paths in isolation.
+
+    python benchmark.py --topics 20000 --out bench_results.json
+    python benchmark.py --baseline bench_results.json      # exit code 1 on regressions
+
+The database is created in a temp directory (or --db) and selected through THEMENSAMMLER_DB
+before db is imported, so the real themensammler.db is never touched."""
+import os, sys, ast, json, time, random, argparse, tempfile, platform, sqlite3, statistics, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORDS = ("Mieterstrom Speicher Wärmepumpe Netzanschluss Förderung Quartier Dachfläche Leuchtturm Cashflow "
+         "Gebäudeversorgung Messkonzept Direktvermarktung Ladesäule Wallbox Bilanzkreis Einspeisung PV-Anlage "
+         "Vertrag Angebot Abstimmung Netzbetreiber Energieausweis Sanierung Wohnungsbau Gewerbe Hotel").split()
+
+def _text(rnd, n:int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+def _iso(dt:datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+# ---------- Synthetic data ----------
+def generate(db, sizes:dict, seed:int=42):
+    """Fill the (empty) benchmark database: sizes has topics, updates, comments (per topic, average),
+    links (per topic) and categories. About a quarter of the topics are archived."""
+    rnd = random.Random(seed)
+    cats = [f"Rubrik {i:02d}" for i in range(sizes["categories"])]
+    start = datetime(2022, 1, 1, tzinfo=db.TZ)
+    span = int((datetime.now(db.TZ) - start).total_seconds())
+    with db.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO categories(name) VALUES(?)", [(c,) for c in cats])
+        topics = []
+        for _ in range(sizes["topics"]):
+            created = start + timedelta(seconds=rnd.randrange(span))
+            archived = _iso(created + timedelta(days=rnd.randrange(1, 90))) if rnd.random() < 0.25 else None
+            topics.append((_text(rnd, rnd.randint(3, 7)), _text(rnd, rnd.randint(10, 60)), rnd.choice(cats),
+                           rnd.choice(db.USERS), _iso(created), archived))
+        conn.executemany("""INSERT INTO topics(title, description, category, created_by, created_at, archived_at)
+                            VALUES(?,?,?,?,?,?)""", topics)
+        ids = [r[0] for r in conn.execute("SELECT id FROM topics ORDER BY id")]
+        conn.executemany("INSERT INTO topic_links(topic_id, label, url) VALUES(?,?,?)",
+                         ((tid, rnd.choice(WORDS), f"https://example.org/{tid}/{n}")
+                          for tid in ids for n in range(rnd.randint(0, 2 * sizes["links"]))))
+        for kind in ("updates", "comments"):
+            conn.executemany(f"INSERT INTO {kind}(topic_id, user, content, created_at) VALUES(?,?,?,?)",
+                             ((tid, rnd.choice(db.USERS), _text(rnd, rnd.randint(5, 25)),
+                               _iso(start + timedelta(seconds=rnd.randrange(span))))
+                              for tid in ids for _ in range(rnd.randint(0, 2 * sizes[kind]))))
+    db.maintenance()  # archived topics to the cold store, statistics, and no maintenance job during the runs
+
+def write_import_file(path:str, rows:int, tag:str, seed:int=7):
+    """Excel file in the import format with rows unique to tag (so repeated imports are no duplicates)."""
+    from openpyxl import Workbook
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(["Titel", "Beschreibung", "Rubrik", "Autor", "Eroeffnung", "Links"])
+    for n in range(rows):
+        ws.append([f"{_text(rnd, 4)} {tag}-{n}", _text(rnd, 30), "Import", "Kurt", "2024-05-01 10:00:00",
+                   json.dumps([{"label": "Doku", "url": f"https://example.org/import/{tag}/{n}"}])])
+    wb.save(path)
+
+# ---------- Timing ----------
+def measure(fn, repeat:int, warmup:int=1) -> dict:
+    """Wall-clock statistics of fn() in milliseconds; fn may return a dict of extra metrics."""
+    for _ in range(warmup):
+        fn()
+    times, extra = [], {}
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        extra = res if isinstance(res, dict) else {}
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {"runs": repeat, "min_ms": times[0], "median_ms": statistics.median(times),
+            "p95_ms": times[min(len(times) - 1, round(0.95 * (len(times) - 1)))],
+            "mean_ms": statistics.fmean(times), **extra}
+
+FILTER_CASES = {
+    "all": {},
+    "category": {"categories": ["Rubrik 01"]},
+    "author": {"users": ["Annika"]},
+    "date_range": {"date_from": "-365", "date_to": "-1"},
+    "search": {"q": "speich"},
+    "combined": {"categories": ["Rubrik 01", "Rubrik 02"], "users": ["Marek"], "q": "netz", "date_from": "-730"},
+    "archived": {"archived_only": True},
+    "activity": {"order": "activity"},  # the snapshot's last-activity order; the SQL listing ignores it
+}
+
+def _filters(case:dict) -> dict:
+    today = datetime.now().date()
+    return {k: today + timedelta(days=int(v)) if k.startswith("date_") else v for k, v in case.items()}
+
+def bench_list_topics(db, args, results, workdir):
+    # The read cache is bypassed: the point is the query, not a dictionary lookup
+    for name, case in FILTER_CASES.items():
+        f = _filters(case)
+        results[f"list_topics[{name}]"] = measure(lambda: {"rows": len(db.list_topics.__wrapped__(f))}, args.repeat)
+        results[f"list_topics_page[{name}]"] = measure(lambda: {"rows": len(db.list_topics_page.__wrapped__(f, 50)[0])}, args.repeat)
+    # Columnar snapshot (snapshot.py, used by the app): the load, the filtering itself and a whole
+    # page. Search cases run with the term's FTS hits cached, as when other filters change around it.
+    import snapshot
+    results["snapshot[load]"] = measure(lambda: {"rows": len(snapshot.TopicSnapshot().columns().ids)}, args.heavy_repeat, warmup=0)
+    snap = snapshot.TopicSnapshot()
+    for name, case in FILTER_CASES.items():
+        f = _filters(case)
+        results[f"snapshot_filter[{name}]"] = measure(lambda: {"rows": len(snap.select(f)[0])}, args.repeat)
+        results[f"snapshot_page[{name}]"] = measure(lambda: {"rows": len(snap.page(f, 50)[0])}, args.repeat)
+
+# What the dashboard would cost without the summary tables: the same numbers by GROUP BY
+DASHBOARD_GROUP_BY = [
+    "SELECT category, COUNT(*) FROM {s}.topics GROUP BY category",
+    "SELECT created_by, COUNT(*) FROM {s}.topics GROUP BY created_by",
+    "SELECT substr(created_at, 1, 7), COUNT(*) FROM {s}.topics WHERE created_ts IS NOT NULL GROUP BY 1",
+    """SELECT t.id, (SELECT COUNT(*) FROM {s}.updates WHERE topic_id = t.id) + (SELECT COUNT(*) FROM {s}.comments WHERE topic_id = t.id) AS n
+       FROM {s}.topics t ORDER BY n DESC LIMIT 10""",
+    """SELECT topic_id, MAX(created_ts) AS ts FROM (SELECT topic_id, created_ts FROM {s}.updates UNION ALL
+       SELECT topic_id, created_ts FROM {s}.comments) GROUP BY topic_id ORDER BY ts DESC LIMIT 10""",
+]
+
+def bench_dashboard(db, args, results, workdir):
+    def summary():
+        db.topic_counts.__wrapped__()
+        return {"rows": sum(len(db.topic_activity.__wrapped__(order, 10)) for order in db.ACTIVITY_ORDERS)}
+    results["dashboard[summary_tables]"] = measure(summary, args.repeat)
+    conn = db.get_conn()
+    results["dashboard[group_by]"] = measure(lambda: {"rows": sum(len(conn.execute(q.format(s=s)).fetchall())
+                                                                  for q in DASHBOARD_GROUP_BY for s in db.STORES)}, args.repeat)
+
+def bench_overview(db, args, results, workdir):
+    """Full script run of app.py as Streamlit would do it, first run and idle reruns.
+
+    The wall time includes AppTest's polling; script_ms is the app's own render.rerun measurement
+    and sql_statements what a run still sends to SQLite (an idle rerun should be served from cache)."""
+    from streamlit.testing.v1 import AppTest
+    from profiling import profiler
+    profiler.log_path = os.path.join(workdir, "profile.jsonl")
+
+    def profiled(run, **kw):
+        profiler.reset()
+        profiler.enabled = True
+        try:
+            res = measure(run, **kw)
+        finally:
+            profiler.enabled = False
+        stats = profiler.stats()
+        res["script_ms"] = next(r["p50_ms"] for r in stats if r["op"] == "render.rerun")
+        res["sql_statements"] = sum(r["count"] for r in stats if r["op"].startswith("sql")) / res["runs"]
+        return res
+
+    at = AppTest.from_file(os.path.join(HERE, "app.py"), default_timeout=600)
+    results["overview_render[first]"] = profiled(at.run, repeat=1, warmup=0)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    results["overview_render[rerun]"] = profiled(at.run, repeat=args.repeat, warmup=0)
+
+STARTUP_SNIPPET = ("import time, importlib; t0 = time.perf_counter(); [importlib.import_module(m) for m in {modules!r}]; "
+                   "print((time.perf_counter() - t0) * 1000)")
+
+def app_imports() -> list[str]:
+    """Modules app.py imports at the top level, read from its source so the start-up measurement
+    follows app.py without running the UI script."""
+    with open(os.path.join(HERE, "app.py"), encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+def bench_startup(db, args, results, workdir):
+    """Cold start of a fresh interpreter (wall time) importing what app.py imports (Streamlit,
+    pandas, db with its schema check, snapshot, jobs, ...); import_ms is the import part alone."""
+    snippet = STARTUP_SNIPPET.format(modules=app_imports())
+
+    def run():
+        out = subprocess.run([sys.executable, "-c", snippet], cwd=HERE, env=os.environ,
+                             capture_output=True, text=True, check=True)
+        return {"import_ms": float(out.stdout.strip())}
+    results["startup[import]"] = measure(run, args.repeat, warmup=1)
+
+def bench_pdf(db, args, results, workdir):
+    import exports
+    open_ids = db.list_topic_ids.__wrapped__({})
+    for label, ids in (("1", open_ids[:1]), ("100", open_ids[:100]), ("all", [])):
+        results[f"build_pdf[{label}]"] = measure(lambda: {"bytes": len(exports.build_pdf(ids))},
+                                                 args.repeat if label != "all" else args.heavy_repeat, warmup=0)
+    results["build_pdf[100+followups]"] = measure(lambda: {"bytes": len(exports.build_pdf(open_ids[:100], True))}, args.repeat, warmup=0)
+
+def bench_import(db, args, results, workdir):
+    import importer
+    files = []
+    for n in range(args.heavy_repeat):
+        path = os.path.join(workdir, f"import_{n}.xlsx")
+        write_import_file(path, args.import_rows, f"run{n}")
+        files.append(path)
+    pending = iter(files)
+    results["import_excel"] = measure(lambda: {"rows": importer.import_excel(next(pending))["imported"]},
+                                      args.heavy_repeat, warmup=0)
+
+def bench_archive_export(db, args, results, workdir):
+    import exports
+    target = os.path.join(workdir, "archiv.xlsx")
+    results["archive_export[full]"] = measure(lambda: exports.export_archive_excel(target, full=True), args.heavy_repeat, warmup=0)
+    results["archive_export[incremental]"] = measure(lambda: exports.export_archive_excel(target), args.repeat)
+
+def bench_writes(db, args, results, workdir):
+    """Write helpers from many threads at once, as concurrent Streamlit sessions would issue them."""
+    ids = db.list_topic_ids.__wrapped__({})[:1000]
+    ops = (lambda tid, n: db.add_update(tid, "Marek", f"Bench-Update {n}"),
+           lambda tid, n: db.add_comment(tid, "Gerd", f"Bench-Kommentar {n}"),
+           lambda tid, n: db.add_link_to_topic(tid, f"https://example.org/bench/{n}", ""),
+           lambda tid, n: db.update_topic_category(tid, "Rubrik 00"))
+    latencies, lock = [], threading.Lock()
+
+    def worker(w):
+        rnd = random.Random(w)
+        for n in range(args.write_ops):
+            t0 = time.perf_counter()
+            rnd.choice(ops)(rnd.choice(ids), n)
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+    def run():
+        latencies.clear()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as ex:
+            list(ex.map(worker, range(args.threads)))
+        elapsed = time.perf_counter() - t0
+        lat = sorted(latencies)
+        return {"ops": len(lat), "ops_per_s": len(lat) / elapsed,
+                "op_p50_ms": lat[len(lat) // 2], "op_p95_ms": lat[int(0.95 * (len(lat) - 1))]}
+    results[f"write_helpers[{args.threads}x{args.write_ops}]"] = measure(run, args.heavy_repeat, warmup=0)
+
+def _api_batch(port:int, paths:list[str], threads:int, headers:dict|None=None) -> dict:
+    """GET every path once, spread over threads with one keep-alive connection each."""
+    import http.client
+    def worker(part):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        for path in part:
+            conn.request("GET", path, headers=headers or {})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status not in (200, 304):
+                raise RuntimeError(f"{path}: HTTP {resp.status}")
+        conn.close()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(worker, [paths[i::threads] for i in range(threads)]))
+    return {"requests": len(paths), "req_per_s": len(paths) / (time.perf_counter() - t0)}
+
+def bench_api(db, args, results, workdir):
+    """api.py as its own process, as deployed; the clients run in this one. Cached responses, 304
+    polls, uncached pages (every page of the listing once per run) and topic details, a full dump."""
+    import socket, http.client
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "api.py"), "--port", str(port)], cwd=workdir, env=os.environ)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                conn.request("GET", "/api/topics?limit=200")
+                first = json.loads(conn.getresponse().read())
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("api.py ist nicht gestartet")
+                time.sleep(0.2)
+        conn.request("GET", "/api/categories")
+        resp = conn.getresponse()
+        resp.read()
+        etag = resp.getheader("ETag")
+        ids = [t["id"] for t in first["items"]]
+        n = args.api_requests
+        results["api[cached]"] = measure(lambda: _api_batch(port, ["/api/topics?limit=50"] * n, args.api_threads), args.repeat)
+        results["api[not_modified]"] = measure(lambda: _api_batch(port, ["/api/topics?limit=50"] * n, args.api_threads,
+                                                                  {"If-None-Match": etag}), args.repeat)
+        results["api[gzip]"] = measure(lambda: _api_batch(port, ["/api/topics?limit=200"] * n, args.api_threads,
+                                                           {"Accept-Encoding": "gzip"}), args.repeat)
+
+        # Uncached: an extra parameter that changes with every request defeats the response cache
+        bust = iter(range(10**9))
+
+        def pages():
+            # Cursors of consecutive pages are only known one after another: a single client
+            t0, count, cursor = time.perf_counter(), 0, ""
+            while count < n:
+                conn.request("GET", f"/api/topics?limit=50&cursor={cursor}&r={next(bust)}")
+                cursor = json.loads(conn.getresponse().read())["next_cursor"] or ""
+                count += 1
+                if not cursor:
+                    break
+            return {"requests": count, "req_per_s": count / (time.perf_counter() - t0)}
+        results["api[pages]"] = measure(pages, args.repeat)
+        results["api[detail]"] = measure(lambda: _api_batch(port, [f"/api/topics/{t}?r={next(bust)}" for t in (ids * n)[:n]],
+                                                            args.api_threads), args.repeat)
+
+        def dump():
+            conn.request("GET", "/api/topics.ndjson?followups=1", headers={"Accept-Encoding": "gzip"})
+            resp = conn.getresponse()
+            return {"bytes": len(resp.read())}
+        results["api[ndjson]"] = measure(dump, args.heavy_repeat, warmup=0)
+        conn.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+BENCHES = ["startup", "list_topics", "dashboard", "overview", "api", "pdf", "import", "archive_export", "writes"]
+
+def check_budgets(results:dict, budgets:dict) -> list[str]:
+    """Compare medians with the time budgets; annotates results and returns the names over budget."""
+    over = []
+    for name, budget in budgets.items():
+        if name in results and budget:
+            res = results[name]
+            value = res.get("script_ms", res["median_ms"])
+            res["budget_ms"] = budget
+            res["within_budget"] = value <= budget
+            print(f"Budget {name}: {value:.0f} / {budget:.0f} ms {'ok' if value <= budget else 'ÜBERSCHRITTEN'}")
+            if value > budget:
+                over.append(name)
+    return over
+
+# ---------- Baseline ----------
+def compare(results:dict, baseline:dict, tolerance:float) -> list[str]:
+    """Print median changes against the baseline; return the names that got slower than tolerance."""
+    regressions = []
+    print(f"\n{'Benchmark':44} {'Baseline':>10} {'Aktuell':>10} {'Änderung':>9}")
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:44} {'–':>10} {res['median_ms']:10.1f}      neu")
+            continue
+        ratio = res["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:44} {base['median_ms']:10.1f} {res['median_ms']:10.1f} {ratio - 1:+8.0%}{flag}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks der Themensammler-Hot-Paths")
+    ap.add_argument("--db", help="benchmark database (default: temp file, generated fresh)")
+    ap.add_argument("--topics", type=int, default=10000)
+    ap.add_argument("--updates", type=int, default=3, help="updates per topic (average)")
+    ap.add_argument("--comments", type=int, default=2, help="comments per topic (average)")
+    ap.add_argument("--links", type=int, default=1, help="links per topic (average)")
+    ap.add_argument("--categories", type=int, default=12)
+    ap.add_argument("--import-rows", type=int, default=5000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--write-ops", type=int, default=50, help="write operations per thread")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--heavy-repeat", type=int, default=2, help="runs of the slow benchmarks (full PDF, import, archive)")
+    ap.add_argument("--startup-budget-ms", type=float, default=1500, help="cold import of Streamlit and the app modules")
+    ap.add_argument("--first-render-budget-ms", type=float, default=1500, help="first run of app.py in a warm process")
+    ap.add_argument("--rerun-budget-ms", type=float, default=400, help="idle rerun of app.py (script time)")
+    ap.add_argument("--filter-budget-ms", type=float, default=10, help="filtering the topic snapshot (per filter case)")
+    ap.add_argument("--api-requests", type=int, default=500, help="requests per API benchmark run")
+    ap.add_argument("--api-threads", type=int, default=4, help="concurrent API clients")
+    ap.add_argument("--only", nargs="+", choices=BENCHES, default=BENCHES)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--baseline", help="earlier result file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown of the median (0.2 = 20 %%)")
+    args = ap.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="themensammler_bench_")
+    path = os.path.abspath(args.db or os.path.join(workdir, "bench.db"))
+    fresh = not os.path.exists(path)
+    os.environ["THEMENSAMMLER_DB"] = path
+    sys.path.insert(0, HERE)
+    import db
+    sizes = {k: getattr(args, k) for k in ("topics", "updates", "comments", "links", "categories")}
+    t0 = time.perf_counter()
+    if fresh:
+        generate(db, sizes, args.seed)
+    counts = {f"{t}@{s}": db.get_conn().execute(f"SELECT COUNT(*) FROM {s}.{t}").fetchone()[0]
+              for t in ("topics", "updates", "comments", "topic_links") for s in db.STORES}
+    counts["categories"] = db.get_conn().execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+    print(f"DB {path} ({'erzeugt' if fresh else 'vorhanden'} in {time.perf_counter() - t0:.1f} s): {counts}")
+
+    # Order matters: the writing benchmarks run last so that the read paths see the generated data
+    results = {}
+    for name in BENCHES:
+        if name in args.only:
+            t0 = time.perf_counter()
+            globals()[f"bench_{name}"](db, args, results, workdir)
+            print(f"  {name}: {time.perf_counter() - t0:.1f} s")
+
+    over_budget = check_budgets(results, {"startup[import]": args.startup_budget_ms,
+                                           "overview_render[first]": args.first_render_budget_ms,
+                                           "overview_render[rerun]": args.rerun_budget_ms,
+                                           **{f"snapshot_filter[{name}]": args.filter_budget_ms for name in FILTER_CASES}})
+    report = {"meta": {"timestamp": datetime.now(db.TZ).isoformat(timespec="seconds"), "python": platform.python_version(),
+                       "sqlite": sqlite3.sqlite_version, "platform": platform.platform(), "cpus": os.cpu_count(),
+                       "sizes": sizes, "counts": counts},
+              "results": results}
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    print(f"Ergebnisse: {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} Regression(en): {', '.join(regressions)}")
+            return 1
+    return 1 if over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
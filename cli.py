@@ -0,0 +1,148 @@
+# Qrauts AG Themensammler – Kommandozeile (ohne Streamlit, z.B. für nächtliche Exporte per cron)
+"""Batch exports and imports on the app's database layer.
+
+    python cli.py export-pdf --category Wohnungswirtschaft --from 2025-01-01 --out auswahl.pdf
+    python cli.py export-pdf --per-category --out-dir exporte/ --followups
+    python cli.py export-archive --target archiv.xlsx
+    python cli.py import neu1.xlsx neu2.xlsx
+    python cli.py sync-archive
+    python cli.py maintenance
+
+Every command prints its result as one JSON object on stdout; progress goes to stderr. The
+database is themensammler.db in the working directory or THEMENSAMMLER_DB."""
+import os, re, sys, json, hashlib, argparse, multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import db
+import exports
+
+def _filters(args) -> dict:
+    return {"categories": args.category or [], "users": args.author or [], "q": args.search or "",
+            "date_from": args.date_from, "date_to": args.date_to, "archived_only": args.archived}
+
+def _slug(name:str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "ohne_name"
+
+def _file_names(names:list[str]) -> dict:
+    """File name (without suffix) per Rubrik: its slug, plus a short hash of the name where several
+    Rubriken share a slug ("A B" and "A/B"), so no two exports write the same file."""
+    slugs = {name: _slug(name) for name in names}
+    shared = Counter(slug.casefold() for slug in slugs.values())  # case-insensitive file systems
+    return {name: slug if shared[slug.casefold()] == 1 else f"{slug}-{hashlib.sha1(name.encode()).hexdigest()[:6]}"
+            for name, slug in slugs.items()}
+
+def _emit(result:dict):
+    print(json.dumps(result, ensure_ascii=False))
+
+def _progress(label:str):
+    def report(done, total):
+        print(f"\r{label}: {done}/{total or '?'}", end="", file=sys.stderr, flush=True)
+    return report
+
+def cmd_export_pdf(args):
+    filters = _filters(args)
+    if not args.per_category:
+        ids = db.list_topic_ids(filters)
+        if not ids:
+            return {"files": [], "topics": 0}
+        path = exports.export_pdf(ids, args.followups, path=os.path.abspath(args.out), workers=args.workers,
+                                  progress=_progress("PDF"))
+        print(file=sys.stderr)
+        return {"files": [{"path": path, "topics": len(ids)}], "topics": len(ids)}
+
+    # One PDF per Rubrik; the categories are rendered side by side in worker processes
+    os.makedirs(args.out_dir, exist_ok=True)
+    jobs = []
+    names = _file_names(list(dict.fromkeys(args.category or db.get_categories())))
+    for cat, name in names.items():
+        ids = db.list_topic_ids({**filters, "categories": [cat]})
+        if ids:
+            jobs.append((cat, ids, os.path.abspath(os.path.join(args.out_dir, name + ".pdf"))))
+    if not args.category:
+        # Topics without a Rubrik go to _ohne_rubrik.pdf (_slug strips leading "_", so no Rubrik maps to it)
+        filed = {t for _cat, ids, _path in jobs for t in ids}
+        ids = [t for t in db.list_topic_ids(filters) if t not in filed]
+        if ids:
+            jobs.append((None, ids, os.path.abspath(os.path.join(args.out_dir, "_ohne_rubrik.pdf"))))
+    files = []
+    workers = min(args.workers or os.cpu_count() or 1, len(jobs)) or 1
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # workers=1: each category is one process already, no nested pools
+        futures = {pool.submit(exports.export_pdf, ids, args.followups, path, 1): (cat, ids, path) for cat, ids, path in jobs}
+        for n, fut in enumerate(as_completed(futures), start=1):
+            cat, ids, path = futures[fut]
+            fut.result()
+            files.append({"category": cat, "path": path, "topics": len(ids)})
+            _progress("Rubriken")(n, len(jobs))
+    print(file=sys.stderr)
+    return {"files": sorted(files, key=lambda f: f["category"] or ""), "topics": sum(f["topics"] for f in files)}
+
+def cmd_export_archive(args):
+    return exports.export_archive_excel(args.target, full=args.full)
+
+def cmd_import(args):
+    from importer import import_excel
+    results = []
+    for path in args.files:
+        res = import_excel(path, chunk_size=args.chunk_size, progress=_progress(os.path.basename(path)))
+        print(file=sys.stderr)
+        results.append({"file": path, **res})
+    return {"files": results, "imported": sum(r["imported"] for r in results)}
+
+def cmd_sync_archive(args):
+    from archive_sync import sync_archive
+    url = args.url or db.get_setting("archive_excel_url", "")
+    if not url:
+        raise SystemExit("Keine Archiv-URL: --url angeben oder in der App hinterlegen.")
+    return sync_archive(url, args.target)
+
+def cmd_maintenance(args):
+    return db.maintenance(vacuum=not args.no_vacuum)
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="cli.py", description=f"{db.APP_TITLE} – Exporte und Importe ohne Oberfläche")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    pdf = sub.add_parser("export-pdf", help="gefilterte Themen als PDF")
+    pdf.add_argument("--category", action="append", help="Rubrik (mehrfach möglich)")
+    pdf.add_argument("--author", action="append", choices=db.USERS, help="Autor (mehrfach möglich)")
+    pdf.add_argument("--search", help="Volltextsuche wie in der App")
+    pdf.add_argument("--from", dest="date_from", type=date.fromisoformat, help="eröffnet ab (YYYY-MM-DD, inkl.)")
+    pdf.add_argument("--to", dest="date_to", type=date.fromisoformat, help="eröffnet bis (YYYY-MM-DD, inkl.)")
+    pdf.add_argument("--archived", action="store_true", help="archivierte statt offene Themen")
+    pdf.add_argument("--followups", action="store_true", help="mit Updates & Kommentaren")
+    pdf.add_argument("--workers", type=int, help="Prozesse (Standard: Anzahl CPUs)")
+    pdf.add_argument("--out", default="themensammler_export.pdf")
+    pdf.add_argument("--per-category", action="store_true", help="eine Datei je Rubrik (Themen ohne Rubrik: _ohne_rubrik.pdf), parallel erzeugt")
+    pdf.add_argument("--out-dir", default="exporte", help="Zielordner für --per-category")
+    pdf.set_defaults(func=cmd_export_pdf)
+
+    arch = sub.add_parser("export-archive", help="archivierte Themen als Excel (inkrementell)")
+    arch.add_argument("--target", default="archiv.xlsx")
+    arch.add_argument("--full", action="store_true", help="komplett neu aufbauen")
+    arch.set_defaults(func=cmd_export_archive)
+
+    imp = sub.add_parser("import", help="Excel-Dateien importieren")
+    imp.add_argument("files", nargs="+")
+    imp.add_argument("--chunk-size", type=int, default=5000)
+    imp.set_defaults(func=cmd_import)
+
+    sync = sub.add_parser("sync-archive", help="archiv.xlsx von GitHub laden und fehlende Themen übernehmen")
+    sync.add_argument("--url", help="RAW-URL (Standard: die in der App hinterlegte)")
+    sync.add_argument("--target", default="archiv.xlsx")
+    sync.set_defaults(func=cmd_sync_archive)
+
+    maint = sub.add_parser("maintenance", help="Archivierte ins Archiv verschieben, VACUUM/ANALYZE beider Datenbanken")
+    maint.add_argument("--no-vacuum", action="store_true", help="nur Statistiken/Index pflegen, Dateien nicht neu aufbauen")
+    maint.set_defaults(func=cmd_maintenance)
+    return ap
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    _emit(args.func(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1095 @@
+# Qrauts AG Themensammler – Datenbank-Schicht (SQLite, ohne Streamlit-Abhängigkeit)
+import os, sqlite3, json, re, threading, functools, queue, uuid, weakref
+from contextlib import contextmanager
+from collections import OrderedDict
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
+
+from profiling import TimedConnection
+
+APP_TITLE = "Qrauts AG Themensammler"
+USERS = ["Marek", "Annika", "Kurt", "Gerd"]
+DEFAULT_CATEGORIES = ["Wohnungswirtschaft", "Privatpersonen", "Leuchtturmprojekte", "Cashflowprojekte"]
+TZ = ZoneInfo("Europe/Berlin")
+DB_PATH = os.environ.get("THEMENSAMMLER_DB", "themensammler.db")  # set before importing db
+ARCHIVE_DB_PATH = os.environ.get("THEMENSAMMLER_ARCHIVE_DB") or os.path.splitext(DB_PATH)[0] + "_archiv.db"
+
+# ---------- Connection ----------
+# Streamlit runs every session (and every rerun) on its own thread, so each thread gets its own
+# connection instead of all of them sharing one. Connections are recycled through a small idle
+# pool when their thread ends. WAL lets readers proceed while one writer commits; busy_timeout
+# makes concurrent writers wait for the lock instead of failing with "database is locked".
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # WAL + NORMAL: no fsync per commit, still crash-safe
+    "PRAGMA busy_timeout = 10000",
+    "PRAGMA cache_size = -16000",    # 16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+]
+
+# Archived topics live in a second file, attached as schema "cold" (see Hot/cold storage). It gets
+# a small page cache of its own, so old history does not crowd the hot pages out of memory.
+COLD_PRAGMAS = [
+    "PRAGMA cold.journal_mode = WAL",
+    "PRAGMA cold.synchronous = NORMAL",
+    "PRAGMA cold.cache_size = -2000",
+]
+
+def connect(path:str|None=None, factory=TimedConnection):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False, timeout=10, factory=factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    cold = os.path.splitext(path)[0] + "_archiv.db" if path else ARCHIVE_DB_PATH
+    conn.execute("ATTACH DATABASE ? AS cold", (cold,))
+    for pragma in COLD_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """Hands every thread its own connection; idle connections of finished threads are reused."""
+    def __init__(self, max_idle:int=8):
+        self._local = threading.local()
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = connect()
+            self._local.conn = conn
+            self._local.tx_depth = 0
+            weakref.finalize(threading.current_thread(), self._release, conn)
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @property
+    def tx_depth(self) -> int:
+        return getattr(self._local, "tx_depth", 0)
+
+    @tx_depth.setter
+    def tx_depth(self, value:int):
+        self._local.tx_depth = value
+
+pool = ConnectionPool()
+
+def get_conn():
+    """Connection of the calling thread."""
+    return pool.acquire()
+
+@contextmanager
+def transaction():
+    """Group several writes into one transaction and one commit.
+
+    Write helpers called inside the block do not commit on their own; the block commits once
+    at the end (or rolls back on error). Nested blocks join the outer transaction."""
+    conn = get_conn()
+    if pool.tx_depth:
+        pool.tx_depth += 1
+        try:
+            yield conn
+        finally:
+            pool.tx_depth -= 1
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    pool.tx_depth = 1
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        pool.tx_depth = 0
+        bump_data_version()
+
+def _commit(conn):
+    """Commit a helper's write, unless it is part of an enclosing transaction()."""
+    if not pool.tx_depth:
+        conn.commit()
+        bump_data_version()
+
+# ---------- Hot/cold storage ----------
+# Open topics stay in the main ("hot") file, archived ones are moved with their links and
+# follow-ups into the attached "cold" file. Ids are only ever allocated by main.topics
+# (AUTOINCREMENT), so they are unique across both files and a topic keeps its id when it moves.
+STORES = ("main", "cold")
+
+# Tables that travel with a topic: (table, stored columns, column holding the topic id)
+MOVE_TABLES = [
+    ("topics", "id, title, description, category, created_by, created_at, archived_at, updated_at", "id"),
+    ("topic_links", "id, topic_id, label, url", "topic_id"),
+    ("updates", "id, topic_id, user, content, created_at", "topic_id"),
+    ("comments", "id, topic_id, user, content, created_at", "topic_id"),
+]
+
+def union_all(sql:str) -> str:
+    """sql once per store ({s} = schema name), combined with UNION ALL. Bind shared parameters
+    as ?1, ?2 ...; conditions inside each part are evaluated with that file's indexes."""
+    return " UNION ALL ".join(sql.format(s=s) for s in STORES)
+
+_IN_IDS = "IN (SELECT value FROM json_each(?))"
+
+def _unlogged(conn, topic_ids:list[int], statements:list[str]):
+    """Run statements (the id list bound as ?) with the topics listed in topic_moves, so the
+    change-log triggers ignore the copies and deletes of a move."""
+    ids = (json.dumps([int(t) for t in topic_ids]),)
+    conn.execute("INSERT OR IGNORE INTO main.topic_moves(topic_id) SELECT value FROM json_each(?)", ids)
+    for sql in statements:
+        conn.execute(sql, ids)
+    conn.execute(f"DELETE FROM main.topic_moves WHERE topic_id {_IN_IDS}", ids)
+
+def _copy(conn, topic_ids:list[int], src:str, dst:str):
+    """First half of a move: copy topics with their links and follow-ups from schema src to dst.
+
+    Rows an interrupted earlier move left in dst are deleted first. REPLACE would drop them
+    without running the delete triggers (recursive_triggers is off), so dst's FTS index and
+    summary tables would count the topic twice."""
+    _unlogged(conn, topic_ids, [f"DELETE FROM {dst}.{table} WHERE {key} {_IN_IDS}" for table, _cols, key in reversed(MOVE_TABLES)]
+                               + [f"INSERT INTO {dst}.{table}({cols}) SELECT {cols} FROM {src}.{table} WHERE {key} {_IN_IDS}"
+                                  for table, cols, key in MOVE_TABLES])
+
+def _settle(conn, topic_ids:list[int]) -> int:
+    """Second half of a move: drop the source rows of those topics that are in both files, i.e.
+    archived ones from the hot file and open ones from the cold file. Returns the number dropped.
+
+    Each settled topic gets a change-log entry: readers that saw it in both files between the two
+    commits (snapshot, API ETags) have to read it again."""
+    ids = (json.dumps([int(t) for t in topic_ids]),)
+    archived = [r[0] for r in conn.execute(f"""SELECT id FROM main.topics WHERE id {_IN_IDS}
+        AND archived_at IS NOT NULL AND id IN (SELECT id FROM cold.topics)""", ids)]
+    reopened = [r[0] for r in conn.execute(f"""SELECT id FROM cold.topics WHERE id {_IN_IDS}
+        AND id IN (SELECT id FROM main.topics WHERE archived_at IS NULL)""", ids)]
+    # Children explicitly: databases older than the schema of _m1_base_schema lack the foreign keys
+    for src, drop in (("main", archived), ("cold", reopened)):
+        if drop:
+            _unlogged(conn, drop, [f"DELETE FROM {src}.{table} WHERE {key} {_IN_IDS}" for table, _cols, key in reversed(MOVE_TABLES)])
+    if archived or reopened:
+        conn.execute("""INSERT INTO main.change_log(tbl, row_id, op, topic_id, changed_at)
+            SELECT 'topics', value, 'update', value, strftime('%Y-%m-%dT%H:%M:%SZ', 'now') FROM json_each(?)""",
+                     (json.dumps(archived + reopened),))
+    return len(archived) + len(reopened)
+
+def _move(conn, topic_ids:list[int], src:str, dst:str):
+    """Copy and settle in the caller's transaction, for schema migrations. The write helpers run
+    the two halves in separate transactions instead: with WAL each file commits on its own, and
+    only a committed copy makes deleting the source safe (see sweep_archived)."""
+    _copy(conn, topic_ids, src, dst)
+    _settle(conn, topic_ids)
+
+# ---------- Schema migrations ----------
+# Each migration brings the schema from version n-1 to n; the applied version is stored in
+# PRAGMA user_version. Migrations must stay idempotent for databases created before the
+# versioning existed (user_version 0 but tables already present).
+def _m1_base_schema(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS settings(
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS categories(
+        name TEXT PRIMARY KEY
+    );""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS topics(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        category TEXT,
+        created_by TEXT,
+        created_at TEXT,
+        links TEXT DEFAULT '[]',
+        archived_at TEXT,
+        FOREIGN KEY(category) REFERENCES categories(name) ON UPDATE CASCADE ON DELETE SET NULL
+    );""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS updates(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic_id INTEGER,
+        user TEXT,
+        content TEXT,
+        created_at TEXT,
+        FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
+    );""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS comments(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic_id INTEGER,
+        user TEXT,
+        content TEXT,
+        created_at TEXT,
+        FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
+    );""")
+
+def _m2_search_index(cur):
+    """FTS5 index over topic title/description plus update and comment content.
+
+    The virtual tables use external content, so the text itself lives only once in
+    topics/updates/comments; the triggers below keep the index in sync for every
+    write path (UI, import, direct SQL)."""
+    fresh = cur.execute("SELECT 1 FROM sqlite_master WHERE name='topics_fts'").fetchone() is None
+    tokenize = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+    cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5(title, description, content='topics', content_rowid='id', {tokenize});")
+    cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS updates_fts USING fts5(content, content='updates', content_rowid='id', {tokenize});")
+    cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(content, content='comments', content_rowid='id', {tokenize});")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS topics_fts_ai AFTER INSERT ON topics BEGIN
+        INSERT INTO topics_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END;""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS topics_fts_ad AFTER DELETE ON topics BEGIN
+        INSERT INTO topics_fts(topics_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END;""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS topics_fts_au AFTER UPDATE OF title, description ON topics BEGIN
+        INSERT INTO topics_fts(topics_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO topics_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END;""")
+    for t in ("updates", "comments"):
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {t}_fts_ai AFTER INSERT ON {t} BEGIN
+            INSERT INTO {t}_fts(rowid, content) VALUES (new.id, new.content);
+        END;""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {t}_fts_ad AFTER DELETE ON {t} BEGIN
+            INSERT INTO {t}_fts({t}_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END;""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {t}_fts_au AFTER UPDATE OF content ON {t} BEGIN
+            INSERT INTO {t}_fts({t}_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO {t}_fts(rowid, content) VALUES (new.id, new.content);
+        END;""")
+    if fresh:
+        # Existing databases: index everything that was written before the FTS tables existed
+        for t in ("topics_fts", "updates_fts", "comments_fts"):
+            cur.execute(f"INSERT INTO {t}({t}) VALUES('rebuild')")
+
+def _m3_sortable_timestamps(cur):
+    """UTC epoch columns next to the ISO text timestamps, plus indexes for list_topics.
+
+    The *_ts columns are virtual generated columns: SQLite derives them from the text
+    column (honouring the +02:00 offset), so existing rows need no backfill pass and no
+    write path can forget to maintain them. Being indexed, they turn ORDER BY / date
+    filters into index range scans instead of datetime() calls on every row."""
+    epoch = "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', {}) AS INTEGER)) VIRTUAL"
+    cur.execute(f"ALTER TABLE topics ADD COLUMN created_ts {epoch.format('created_at')}")
+    cur.execute(f"ALTER TABLE topics ADD COLUMN archived_ts {epoch.format('archived_at')}")
+    cur.execute(f"ALTER TABLE updates ADD COLUMN created_ts {epoch.format('created_at')}")
+    cur.execute(f"ALTER TABLE comments ADD COLUMN created_ts {epoch.format('created_at')}")
+    # Overview (open topics): plain listing, filtered by Rubrik, filtered by Autor
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topics_open_created ON topics(created_ts) WHERE archived_at IS NULL")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topics_open_category ON topics(category, created_ts) WHERE archived_at IS NULL")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topics_open_author ON topics(created_by, created_ts) WHERE archived_at IS NULL")
+    # Archive tab and archive export
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topics_archived_created ON topics(created_ts) WHERE archived_at IS NOT NULL")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topics_archived_at ON topics(archived_ts) WHERE archived_at IS NOT NULL")
+    # Follow-ups per topic, newest first
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_updates_topic ON updates(topic_id, created_ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_comments_topic ON comments(topic_id, created_ts)")
+
+def _m4_topic_links(cur):
+    """Links move from the JSON blob topics.links into their own table.
+
+    Adding a link becomes a single INSERT instead of a read-modify-write of the blob, which
+    lost links when two sessions appended at the same time. Existing blobs are unpacked in
+    their stored order; entries without a url are dropped."""
+    cur.execute("""CREATE TABLE IF NOT EXISTS topic_links(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic_id INTEGER NOT NULL,
+        label TEXT,
+        url TEXT NOT NULL,
+        FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
+    );""")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topic_links_topic ON topic_links(topic_id, id)")
+    cur.execute("""INSERT INTO topic_links(topic_id, label, url)
+        SELECT topic_id, COALESCE(NULLIF(TRIM(label), ''), url), url FROM (
+            SELECT t.id AS topic_id, j.key AS pos,
+                   CASE WHEN j.type = 'object' THEN json_extract(j.value, '$.label') END AS label,
+                   TRIM(CASE WHEN j.type = 'object' THEN json_extract(j.value, '$.url') END) AS url
+              FROM topics t, json_each(CASE WHEN json_valid(t.links) AND json_type(t.links) = 'array'
+                                            THEN t.links ELSE '[]' END) j)
+        WHERE url IS NOT NULL AND url != ''
+        ORDER BY topic_id, pos""")
+    cur.execute("ALTER TABLE topics DROP COLUMN links")
+
+def _m5_jobs(cur):
+    """Records of background jobs (see jobs.py): what was requested, by whom, and how it went.
+
+    key identifies kind + parameters, so a duplicate submission can find a job that is still
+    queued or running; owner is the pid of the process whose pool runs the job."""
+    cur.execute("""CREATE TABLE IF NOT EXISTS jobs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        params TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress REAL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_by TEXT,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        owner INTEGER
+    );""")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_jobs_active ON jobs(key) WHERE status IN ('queued', 'running')")
+
+def _m6_change_log(cur):
+    """topics.updated_at plus an append-only change_log, both maintained by triggers.
+
+    Every insert/update/delete on topics, updates, comments, topic_links and categories appends
+    (seq, tbl, row_id, op, topic_id, changed_at) to change_log; row_id is the row's id (the name
+    for categories) and topic_id the topic the change belongs to. Changes to a topic itself, its
+    links or follow-ups also set topics.updated_at. Only the data columns fire the topic triggers,
+    so touching updated_at neither logs nor re-touches."""
+    cur.execute("ALTER TABLE topics ADD COLUMN updated_at TEXT")
+    cur.execute("ALTER TABLE topics ADD COLUMN updated_ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', updated_at) AS INTEGER)) VIRTUAL")
+    # Existing topics: last of opening, archiving and their newest update/comment
+    cur.execute("""UPDATE topics SET updated_at = (
+        SELECT ts FROM (
+            SELECT topics.created_at AS ts, topics.created_ts AS e
+            UNION ALL SELECT topics.archived_at, topics.archived_ts WHERE topics.archived_at IS NOT NULL
+            UNION ALL SELECT created_at, created_ts FROM updates WHERE topic_id = topics.id
+            UNION ALL SELECT created_at, created_ts FROM comments WHERE topic_id = topics.id
+        ) ORDER BY e DESC LIMIT 1)""")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_topics_updated ON topics(updated_ts)")
+    cur.execute("""CREATE TABLE IF NOT EXISTS change_log(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        row_id,
+        op TEXT NOT NULL,
+        topic_id INTEGER,
+        changed_at TEXT NOT NULL
+    );""")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_change_log_topic ON change_log(topic_id, seq)")
+    _change_log_triggers(cur)
+
+def _change_log_triggers(cur, skip_moves:bool=False):
+    """(Re)create the triggers of _m6_change_log. skip_moves: inserts/deletes of topics listed in
+    topic_moves are storage moves (see _move), not changes, and are not logged."""
+    now = "strftime('%Y-%m-%dT%H:%M:%SZ', 'now')"
+    data_cols = "title, description, category, created_by, created_at, archived_at"
+    guard = lambda topic: f"WHEN NOT EXISTS (SELECT 1 FROM topic_moves WHERE topic_id = {topic})" if skip_moves else ""
+    log = "INSERT INTO change_log(tbl, row_id, op, topic_id, changed_at) VALUES ('{tbl}', {row}, '{op}', {topic}, " + now + ");"
+    touch = "UPDATE topics SET updated_at = " + now + " WHERE id = {topic};"
+
+    def trigger(name, event, sql):
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"CREATE TRIGGER {name} {event} BEGIN {sql} END;")
+    trigger("topics_log_ai", f"AFTER INSERT ON topics {guard('new.id')}", f"""
+        UPDATE topics SET updated_at = COALESCE(new.created_at, {now}) WHERE id = new.id AND new.updated_at IS NULL;
+        {log.format(tbl="topics", row="new.id", op="insert", topic="new.id")}""")
+    trigger("topics_log_au", f"AFTER UPDATE OF {data_cols} ON topics", f"""
+        {touch.format(topic="new.id")}
+        {log.format(tbl="topics", row="new.id", op="update", topic="new.id")}""")
+    trigger("topics_log_ad", f"AFTER DELETE ON topics {guard('old.id')}",
+            log.format(tbl="topics", row="old.id", op="delete", topic="old.id"))
+    for t in ("updates", "comments", "topic_links"):
+        trigger(f"{t}_log_ai", f"AFTER INSERT ON {t} {guard('new.topic_id')}", f"""
+            {touch.format(topic="new.topic_id")}
+            {log.format(tbl=t, row="new.id", op="insert", topic="new.topic_id")}""")
+        trigger(f"{t}_log_au", f"AFTER UPDATE ON {t}", f"""
+            {touch.format(topic="new.topic_id")}
+            {log.format(tbl=t, row="new.id", op="update", topic="new.topic_id")}""")
+        trigger(f"{t}_log_ad", f"AFTER DELETE ON {t} {guard('old.topic_id')}", f"""
+            {touch.format(topic="old.topic_id")}
+            {log.format(tbl=t, row="old.id", op="delete", topic="old.topic_id")}""")
+    for op, row in (("insert", "new.name"), ("update", "new.name"), ("delete", "old.name")):
+        trigger(f"categories_log_a{op[0]}", f"AFTER {op.upper()} ON categories",
+                log.format(tbl="categories", row=row, op=op, topic="NULL"))
+
+def _m7_cold_storage(cur):
+    """Archived topics move to the cold file (see Hot/cold storage).
+
+    topic_moves marks topics while _move copies them, so the change log records only the
+    archiving itself. The archive indexes of the hot file are no longer needed."""
+    cur.execute("CREATE TABLE IF NOT EXISTS topic_moves(topic_id INTEGER PRIMARY KEY)")
+    _change_log_triggers(cur, skip_moves=True)
+    cur.execute("DROP INDEX IF EXISTS ix_topics_archived_created")
+    cur.execute("DROP INDEX IF EXISTS ix_topics_archived_at")
+    ids = [r[0] for r in cur.execute("SELECT id FROM main.topics WHERE archived_at IS NOT NULL")]
+    if ids:
+        _move(cur, ids, "main", "cold")
+
+# ---------- Dashboard summary tables ----------
+# Both files carry topic_counts and topic_activity for their own topics (hot = open, cold =
+# archived), maintained by triggers of that file. A move is an insert into one file and a delete
+# from the other, so archiving and restoring keep both sides right without extra bookkeeping.
+# Follow-ups are only ever added or deleted; editing one does not update the activity.
+STATS_DIMS = {"all": "''", "category": "COALESCE({r}.category, '')", "author": "COALESCE({r}.created_by, '')",
+              "month": "CASE WHEN {r}.created_ts IS NULL THEN '' ELSE substr({r}.created_at, 1, 7) END"}  # local month
+
+# (last_at, last_ts) of a topic: the latest of its opening and its follow-ups; {p} is the schema prefix
+_LAST_ACTIVITY = """(SELECT at, ts FROM (
+        SELECT created_at AS at, created_ts AS ts FROM {p}topics WHERE id = {t}
+        UNION ALL SELECT * FROM (SELECT created_at, created_ts FROM {p}updates WHERE topic_id = {t} ORDER BY created_ts DESC LIMIT 1)
+        UNION ALL SELECT * FROM (SELECT created_at, created_ts FROM {p}comments WHERE topic_id = {t} ORDER BY created_ts DESC LIMIT 1)
+    ) ORDER BY ts DESC LIMIT 1)"""
+
+def _stats_schema(cur, schema:str):
+    cur.execute(f"""CREATE TABLE IF NOT EXISTS {schema}.topic_counts(
+        dim TEXT NOT NULL,
+        key TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY(dim, key)
+    ) WITHOUT ROWID;""")
+    cur.execute(f"""CREATE TABLE IF NOT EXISTS {schema}.topic_activity(
+        topic_id INTEGER PRIMARY KEY,
+        updates INTEGER NOT NULL,
+        comments INTEGER NOT NULL,
+        last_at TEXT,
+        last_ts INTEGER
+    );""")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {schema}.ix_topic_activity_total ON topic_activity(updates + comments)")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {schema}.ix_topic_activity_last ON topic_activity(last_ts)")
+
+    def count(rows:list[tuple[str, int]], dims=STATS_DIMS) -> str:
+        """One upsert adding delta to every dimension key of each (row, delta)."""
+        values = ", ".join(f"('{dim}', {dims[dim].format(r=r)}, {delta})" for r, delta in rows for dim in dims)
+        return f"INSERT INTO topic_counts(dim, key, n) VALUES {values} ON CONFLICT(dim, key) DO UPDATE SET n = n + excluded.n;"
+    moved_dims = {dim: expr for dim, expr in STATS_DIMS.items() if dim != "all"}  # an update leaves the total as is
+    newer = "(new.created_ts >= last_ts OR last_ts IS NULL)"
+
+    def trigger(name, event, sql):
+        cur.execute(f"DROP TRIGGER IF EXISTS {schema}.{name}")
+        cur.execute(f"CREATE TRIGGER {schema}.{name} {event} BEGIN {sql} END;")
+    trigger("topics_stats_ai", "AFTER INSERT ON topics", f"""
+        {count([("new", 1)])}
+        INSERT OR REPLACE INTO topic_activity(topic_id, updates, comments, last_at, last_ts)
+        VALUES (new.id, 0, 0, new.created_at, new.created_ts);""")
+    trigger("topics_stats_ad", "AFTER DELETE ON topics", f"""
+        {count([("old", -1)])}
+        DELETE FROM topic_activity WHERE topic_id = old.id;""")
+    trigger("topics_stats_au", "AFTER UPDATE OF category, created_by, created_at ON topics", f"""
+        {count([("old", -1), ("new", 1)], moved_dims)}
+        UPDATE topic_activity SET (last_at, last_ts) = {_LAST_ACTIVITY.format(p="", t="new.id")}
+        WHERE topic_id = new.id AND new.created_at IS NOT old.created_at;""")
+    for t in ("updates", "comments"):
+        trigger(f"{t}_stats_ai", f"AFTER INSERT ON {t}", f"""
+            UPDATE topic_activity SET {t} = {t} + 1,
+                last_at = CASE WHEN {newer} THEN new.created_at ELSE last_at END,
+                last_ts = CASE WHEN {newer} THEN new.created_ts ELSE last_ts END
+            WHERE topic_id = new.topic_id;""")
+        trigger(f"{t}_stats_ad", f"AFTER DELETE ON {t}", f"""
+            UPDATE topic_activity SET {t} = {t} - 1 WHERE topic_id = old.topic_id;
+            UPDATE topic_activity SET (last_at, last_ts) = {_LAST_ACTIVITY.format(p="", t="old.topic_id")}
+            WHERE topic_id = old.topic_id AND old.created_ts >= last_ts;""")
+
+def _rebuild_stats(cur, schema:str):
+    """Recompute the summary tables of a schema from its topics and follow-ups."""
+    cur.execute(f"DELETE FROM {schema}.topic_counts")
+    cur.execute(f"INSERT INTO {schema}.topic_counts(dim, key, n) " + " UNION ALL ".join(
+        f"SELECT '{dim}', {expr.format(r='t')}, COUNT(*) FROM {schema}.topics t GROUP BY 2" for dim, expr in STATS_DIMS.items()))
+    cur.execute(f"DELETE FROM {schema}.topic_activity")
+    cur.execute(f"""INSERT INTO {schema}.topic_activity(topic_id, updates, comments)
+        SELECT t.id, (SELECT COUNT(*) FROM {schema}.updates WHERE topic_id = t.id),
+               (SELECT COUNT(*) FROM {schema}.comments WHERE topic_id = t.id)
+        FROM {schema}.topics t""")
+    cur.execute(f"UPDATE {schema}.topic_activity SET (last_at, last_ts) = "
+                + _LAST_ACTIVITY.format(p=f"{schema}.", t="topic_activity.topic_id"))
+
+def _m8_dashboard_stats(cur):
+    """Summary tables for the dashboard and the "last activity" order (see Dashboard summary tables)."""
+    _stats_schema(cur, "main")
+    _rebuild_stats(cur, "main")
+
+MIGRATIONS = [
+    _m1_base_schema,
+    _m2_search_index,
+    _m3_sortable_timestamps,
+    _m4_topic_links,
+    _m5_jobs,
+    _m6_change_log,
+    _m7_cold_storage,
+    _m8_dashboard_stats,
+]
+
+# The cold file has its own schema version (PRAGMA cold.user_version) and is migrated first,
+# so main migrations can move rows into it.
+def _c1_cold_schema(cur):
+    """Archived topics with links and follow-ups: the hot tables minus the write-side machinery.
+
+    No AUTOINCREMENT (ids come from main), no change-log triggers (changes are logged in main)
+    and no foreign key to categories, which live in main; indexes serve the archive tab, the
+    archive export and per-topic follow-ups. The FTS tables keep the archive searchable."""
+    epoch = "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', {}) AS INTEGER)) VIRTUAL"
+    cur.execute(f"""CREATE TABLE IF NOT EXISTS cold.topics(
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        category TEXT,
+        created_by TEXT,
+        created_at TEXT,
+        archived_at TEXT,
+        updated_at TEXT,
+        created_ts {epoch.format('created_at')},
+        archived_ts {epoch.format('archived_at')},
+        updated_ts {epoch.format('updated_at')}
+    );""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS cold.topic_links(
+        id INTEGER PRIMARY KEY,
+        topic_id INTEGER NOT NULL,
+        label TEXT,
+        url TEXT NOT NULL,
+        FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
+    );""")
+    for t in ("updates", "comments"):
+        cur.execute(f"""CREATE TABLE IF NOT EXISTS cold.{t}(
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER,
+            user TEXT,
+            content TEXT,
+            created_at TEXT,
+            created_ts {epoch.format('created_at')},
+            FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
+        );""")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS cold.ix_{t}_topic ON {t}(topic_id, created_ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS cold.ix_topic_links_topic ON topic_links(topic_id, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS cold.ix_topics_created ON topics(created_ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS cold.ix_topics_category ON topics(category, created_ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS cold.ix_topics_author ON topics(created_by, created_ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS cold.ix_topics_archived_at ON topics(archived_ts)")
+    tokenize = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+    cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS cold.topics_fts USING fts5(title, description, content='topics', content_rowid='id', {tokenize});")
+    cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS cold.updates_fts USING fts5(content, content='updates', content_rowid='id', {tokenize});")
+    cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS cold.comments_fts USING fts5(content, content='comments', content_rowid='id', {tokenize});")
+    # Cold rows are only ever inserted and deleted (moves); trigger bodies refer to cold's own tables
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS cold.topics_fts_ai AFTER INSERT ON topics BEGIN
+        INSERT INTO topics_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END;""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS cold.topics_fts_ad AFTER DELETE ON topics BEGIN
+        INSERT INTO topics_fts(topics_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END;""")
+    for t in ("updates", "comments"):
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS cold.{t}_fts_ai AFTER INSERT ON {t} BEGIN
+            INSERT INTO {t}_fts(rowid, content) VALUES (new.id, new.content);
+        END;""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS cold.{t}_fts_ad AFTER DELETE ON {t} BEGIN
+            INSERT INTO {t}_fts({t}_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END;""")
+
+def _c2_dashboard_stats(cur):
+    _stats_schema(cur, "cold")
+    _rebuild_stats(cur, "cold")
+
+COLD_MIGRATIONS = [
+    _c1_cold_schema,
+    _c2_dashboard_stats,
+]
+
+def migrate(conn, migrations:list=MIGRATIONS, schema:str="main"):
+    """Apply all pending migrations of a schema, each in its own transaction. Returns the schema version.
+
+    The version is read again under each write lock: processes starting together (app, API, CLI)
+    all see the old version at first, and only the first to get the lock may apply a step."""
+    version = conn.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+    if version >= len(migrations):
+        return version
+    isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit BEGIN/COMMIT, so DDL is part of the transaction
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                version = cur.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+                if version >= len(migrations):
+                    cur.execute("COMMIT")
+                    break
+                migrations[version](cur)
+                cur.execute(f"PRAGMA {schema}.user_version = {version + 1}")
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        conn.execute(f"ANALYZE {schema}")
+    finally:
+        conn.isolation_level = isolation
+    return len(migrations)
+
+def init_db():
+    """Create/upgrade both schemas. With current schemas this is two PRAGMA reads: no DDL and no
+    write transaction when a process (app, CLI, worker) starts."""
+    conn = get_conn()
+    main_version, cold_version = (conn.execute(f"PRAGMA {s}.user_version").fetchone()[0] for s in STORES)
+    if main_version >= len(MIGRATIONS) and cold_version >= len(COLD_MIGRATIONS):
+        return conn
+    migrate(conn, COLD_MIGRATIONS, "cold")
+    migrate(conn)
+    # Seed default categories (only on set-up/upgrade, so deleted defaults stay deleted)
+    for cat in DEFAULT_CATEGORIES:
+        conn.execute("INSERT OR IGNORE INTO categories(name) VALUES(?)", (cat,))
+    conn.commit()
+    return conn
+
+init_db()
+
+# ---------- Read cache ----------
+# Reads are cached per process and tagged with the data version they were loaded at. The version
+# combines a counter bumped by every write helper of this process with SQLite's PRAGMA data_version,
+# which changes whenever another connection (e.g. a second app process) commits to the database.
+_write_version = 0
+_version_lock = threading.Lock()
+
+def bump_data_version():
+    global _write_version
+    with _version_lock:
+        _write_version += 1
+
+# PRAGMA data_version is a per-connection counter (one per attached file), so it is always read on
+# this one connection; it changes on commits of every other connection, i.e. our pool and other
+# processes alike.
+# Not profiled: it is polled on every cached read and would only drown the interesting statements.
+_watch_conn = connect(factory=sqlite3.Connection)
+_watch_lock = threading.Lock()
+
+def data_version() -> tuple:
+    with _watch_lock:
+        return (_write_version, *(_watch_conn.execute(f"PRAGMA {s}.data_version").fetchone()[0] for s in STORES))
+
+class ReadCache:
+    """Bounded LRU cache for read helpers; cleared as soon as the data version changes.
+
+    Cached values are shared between sessions and must be treated as read-only."""
+    def __init__(self, maxsize:int=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        version = data_version()
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            if self._version == version:
+                self._data[key] = value
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._data), "maxsize": self.maxsize}
+
+read_cache = ReadCache()
+
+def _freeze(value):
+    """Hashable cache key for filter dicts, id lists and cursors."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def cached(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__name__, _freeze(args), _freeze(kwargs))
+        return read_cache.get_or_load(key, lambda: fn(*args, **kwargs))
+    return wrapper
+
+# ---------- Helpers ----------
+def now_iso():
+    return datetime.now(TZ).isoformat(timespec="seconds")
+
+def day_start_epoch(d:date) -> int:
+    """Epoch seconds of local (Europe/Berlin) midnight at the start of day d."""
+    return int(datetime.combine(d, time.min, TZ).timestamp())
+
+@cached
+def get_categories():
+    conn = get_conn()
+    return [r[0] for r in conn.execute("SELECT name FROM categories ORDER BY name ASC")]
+
+def add_category(name:str):
+    conn = get_conn()
+    name = name.strip()
+    if not name: return
+    conn.execute("INSERT OR IGNORE INTO categories(name) VALUES(?)", (name,))
+    _commit(conn)
+
+def delete_category(name:str):
+    conn = get_conn()
+    conn.execute("DELETE FROM categories WHERE name = ?", (name,))
+    # Foreign keys end at the file boundary: ON DELETE SET NULL by hand for archived topics
+    conn.execute("UPDATE cold.topics SET category = NULL WHERE category = ?", (name,))
+    _commit(conn)
+
+def set_setting(key:str, value:str):
+    conn = get_conn()
+    conn.execute("INSERT INTO settings(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, value))
+    _commit(conn)
+
+@cached
+def get_setting(key:str, default:str=""):
+    conn = get_conn()
+    row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+DATABASE_ID_KEY = "database_id"
+
+def database_id() -> str:
+    """Identity of this database for keys shared beyond it, such as the export cache of the host:
+    both absolute paths plus a UUID stored on first use, so neither another database at the same
+    change-log position nor a recreated file at the same path shares its keys."""
+    uid = get_setting(DATABASE_ID_KEY)
+    if not uid:
+        conn = get_conn()
+        conn.execute("INSERT OR IGNORE INTO settings(key, value) VALUES(?, ?)", (DATABASE_ID_KEY, uuid.uuid4().hex))
+        _commit(conn)
+        uid = get_setting(DATABASE_ID_KEY)
+    return f"{os.path.abspath(DB_PATH)}|{os.path.abspath(ARCHIVE_DB_PATH)}|{uid}"
+
+def create_topic(title, description, category, created_by, links):
+    conn = get_conn()
+    created_at = now_iso()
+    tid = conn.execute("""INSERT INTO topics(title, description, category, created_by, created_at)
+                          VALUES(?,?,?,?,?)""", (title, description, category, created_by, created_at)).lastrowid
+    conn.executemany("INSERT INTO topic_links(topic_id, label, url) VALUES(?,?,?)",
+                     [(tid, l.get("label") or l["url"], l["url"]) for l in links if l.get("url")])
+    _commit(conn)
+    return tid
+
+def update_topic_category(topic_id:int, category:str):
+    conn = get_conn()
+    conn.execute("UPDATE topics SET category=? WHERE id=?", (category, topic_id))
+    _commit(conn)
+
+def add_link_to_topic(topic_id:int, url:str, label:str):
+    conn = get_conn()
+    conn.execute("INSERT INTO topic_links(topic_id, label, url) VALUES(?,?,?)",
+                 (topic_id, label.strip() or url.strip(), url.strip()))
+    _commit(conn)
+
+def add_update(topic_id:int, user:str, content:str):
+    conn = get_conn()
+    conn.execute("""INSERT INTO updates(topic_id,user,content,created_at)
+                    VALUES(?,?,?,?)""", (topic_id, user, content, now_iso()))
+    _commit(conn)
+
+def add_comment(topic_id:int, user:str, content:str):
+    conn = get_conn()
+    conn.execute("""INSERT INTO comments(topic_id,user,content,created_at)
+                    VALUES(?,?,?,?)""", (topic_id, user, content, now_iso()))
+    _commit(conn)
+
+def archive_topic(topic_id:int, user:str):
+    """Mark the topic archived and move it with its links and follow-ups to the cold file."""
+    with transaction() as conn:
+        if not conn.execute("UPDATE main.topics SET archived_at=? WHERE id=?", (now_iso(), topic_id)).rowcount:
+            return
+        _copy(conn, [topic_id], "main", "cold")
+    with transaction() as conn:
+        _settle(conn, [topic_id])
+
+def restore_topic(topic_id:int):
+    """Move the topic back to the hot file and clear archived_at."""
+    with transaction() as conn:
+        # Still in the hot file after an interrupted move: that row is the current one
+        if not conn.execute("SELECT 1 FROM main.topics WHERE id=?", (topic_id,)).fetchone():
+            _copy(conn, [topic_id], "cold", "main")
+        conn.execute("UPDATE main.topics SET archived_at=NULL WHERE id=?", (topic_id,))
+    with transaction() as conn:
+        _settle(conn, [topic_id])
+
+def sweep_archived() -> int:
+    """Move archived topics that are still in the hot file (bulk imports, direct SQL, a crash
+    before the copy committed) to the cold one and finish moves interrupted between copy and
+    settle, in either direction. Returns the number of topics moved to the cold file."""
+    with transaction() as conn:
+        ids = [r[0] for r in conn.execute("SELECT id FROM main.topics WHERE archived_at IS NOT NULL")]
+        if ids:
+            _copy(conn, ids, "main", "cold")
+    with transaction() as conn:
+        _settle(conn, ids + [r[0] for r in conn.execute("SELECT id FROM cold.topics WHERE id IN (SELECT id FROM main.topics)")])
+    return len(ids)
+
+MAINTENANCE_KEY = "maintenance_last"
+
+def _file_bytes(conn, schema:str) -> int:
+    return conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0] * conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+
+def maintenance(vacuum:bool=True) -> dict:
+    """Housekeeping for both files, meant to run while the app is quiet (scheduled as a job, see
+    jobs.py, or via cli.py maintenance).
+
+    Sweeps stray archived topics into the cold file, merges the FTS index segments, refreshes
+    the planner statistics and (vacuum) rebuilds both files, which returns the pages freed by
+    moved topics to the file system, then truncates the WAL files. Returns sizes in bytes."""
+    moved = sweep_archived()
+    with transaction() as conn:
+        for s in STORES:
+            for fts in ("topics_fts", "updates_fts", "comments_fts"):
+                conn.execute(f"INSERT INTO {s}.{fts}({fts}) VALUES('optimize')")
+    before = {s: _file_bytes(conn, s) for s in STORES}
+    for s in STORES:
+        conn.execute(f"ANALYZE {s}")
+        if vacuum:
+            conn.execute(f"VACUUM {s}")
+        conn.execute(f"PRAGMA {s}.wal_checkpoint(TRUNCATE)")
+    bump_data_version()
+    set_setting(MAINTENANCE_KEY, now_iso())
+    return {"moved": moved, "before": before, "after": {s: _file_bytes(conn, s) for s in STORES}}
+
+# ---------- Batched loading ----------
+# Id lists are bound as one JSON array parameter (json_each), so a single statement serves any
+# number of topics without hitting SQLite's host-parameter limit and still uses the topic_id indexes.
+# Lookups by id search both stores: a topic may be open or archived.
+TOPIC_COLS = "id, title, description, category, created_by, created_at, archived_at"
+
+# All topics of both stores, newest first (a merge of two index-ordered scans)
+ALL_TOPICS_SQL = union_all(f"SELECT {TOPIC_COLS}, created_ts FROM {{s}}.topics") + " ORDER BY created_ts DESC, id DESC"
+
+@cached
+def get_topics(topic_ids:list[int]):
+    """Topic rows for the given ids in one query, returned in the order of topic_ids."""
+    conn = get_conn()
+    ids = [int(t) for t in topic_ids]
+    rows = conn.execute(union_all(f"SELECT {TOPIC_COLS} FROM {{s}}.topics WHERE id IN (SELECT value FROM json_each(?1))"),
+                        (json.dumps(ids),)).fetchall()
+    by_id = {r[0]: r for r in rows}
+    return [by_id[t] for t in ids if t in by_id]
+
+@cached
+def load_links(topic_ids:list[int]) -> dict:
+    """Links of many topics in one query: {topic_id: [{"label", "url"}, ...]} in the order they were added."""
+    conn = get_conn()
+    ids = [int(t) for t in topic_ids]
+    result = {tid: [] for tid in ids}
+    if ids:
+        rows = conn.execute(union_all("""SELECT topic_id, label, url, id FROM {s}.topic_links
+                                         WHERE topic_id IN (SELECT value FROM json_each(?1))""")
+                            + " ORDER BY topic_id, id", (json.dumps(ids),))
+        for tid, label, url, _id in rows:
+            result[tid].append({"label": label, "url": url})
+    return result
+
+@cached
+def load_followups(topic_ids:list[int]) -> dict:
+    """Links, updates and comments of many topics in three queries, grouped per topic id.
+
+    Returns {topic_id: {"links": [...], "updates": [(user, content, created_at), ...], "comments": [...]}}
+    (follow-ups newest first) with an entry for every requested id, so callers can index it without checks."""
+    conn = get_conn()
+    ids = [int(t) for t in topic_ids]
+    links = load_links.__wrapped__(ids)
+    result = {tid: {"links": links[tid], "updates": [], "comments": []} for tid in ids}
+    if not ids:
+        return result
+    for kind in ("updates", "comments"):
+        rows = conn.execute(union_all(f"""SELECT topic_id, user, content, created_at, created_ts FROM {{s}}.{kind}
+                                          WHERE topic_id IN (SELECT value FROM json_each(?1))""")
+                            + " ORDER BY topic_id, created_ts DESC", (json.dumps(ids),))
+        for tid, user, content, created_at, _ts in rows:
+            result[tid][kind].append((user, content, created_at))
+    return result
+
+# ---------- Change log ----------
+# Consumers (exports, caches, sync jobs) remember the seq they have processed and ask for what
+# changed since, instead of re-reading all topics.
+CHANGE_COLS = ["seq", "tbl", "row_id", "op", "topic_id", "changed_at"]
+
+def change_seq() -> int:
+    """Sequence number of the latest change, 0 if there is none (O(1): read from sqlite_sequence)."""
+    row = get_conn().execute("SELECT seq FROM sqlite_sequence WHERE name='change_log'").fetchone()
+    return row[0] if row else 0
+
+def changes_since(seq:int=0, limit:int=1000, tables:list[str]|None=None) -> tuple[list[dict], int]:
+    """Change-log entries after seq, oldest first, at most limit. Returns (changes, next_seq).
+
+    Pass next_seq to the following call; fewer than limit entries means the caller has caught up."""
+    q, params = "SELECT seq, tbl, row_id, op, topic_id, changed_at FROM change_log WHERE seq > ?", [seq]
+    if tables:
+        q += " AND tbl IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(tables)))
+    rows = get_conn().execute(q + " ORDER BY seq LIMIT ?", params + [limit]).fetchall()
+    return [dict(zip(CHANGE_COLS, r)) for r in rows], (rows[-1][0] if rows else seq)
+
+def changed_topic_ids(seq:int=0) -> tuple[set[int], int]:
+    """Ids of the topics (including deleted ones) touched by any change after seq, and the seq to
+    continue from next time."""
+    upto = change_seq()
+    rows = get_conn().execute("SELECT DISTINCT topic_id FROM change_log WHERE seq > ? AND seq <= ? AND topic_id IS NOT NULL",
+                              (seq, upto))
+    return {r[0] for r in rows}, upto
+
+def prune_change_log(before_seq:int) -> int:
+    """Delete entries up to before_seq (once every consumer is past it). Returns the number deleted."""
+    conn = get_conn()
+    n = conn.execute("DELETE FROM change_log WHERE seq <= ?", (before_seq,)).rowcount
+    _commit(conn)
+    return n
+
+# ---------- Dashboard ----------
+# Reads of the summary tables: a few dozen rows or an index range, however many topics there are.
+@cached
+def topic_counts() -> dict:
+    """Topics per dimension ("all", "category", "author", "month" = YYYY-MM of the opening), split
+    into open and archived: {dim: {key: {"open": n, "archived": n}}}. Missing values (no Rubrik,
+    and the single key of "all") are None."""
+    result = {dim: {} for dim in STATS_DIMS}
+    rows = get_conn().execute(union_all("SELECT '{s}', dim, key, n FROM {s}.topic_counts WHERE n > 0"))
+    for store, dim, key, n in rows:
+        entry = result.setdefault(dim, {}).setdefault(key or None, {"open": 0, "archived": 0})
+        entry["open" if store == "main" else "archived"] += n
+    return result
+
+ACTIVITY_ORDERS = {"total": "updates + comments", "last": "last_ts"}
+
+@cached
+def topic_activity(order:str="total", limit:int=10) -> list[dict]:
+    """The limit topics with the most follow-ups ("total") or the latest activity ("last"), open
+    and archived: [{"topic_id", "updates", "comments", "last_at"}, ...]. Each file is read along
+    its index; only 2 x limit rows are merged."""
+    key = ACTIVITY_ORDERS[order]
+    sql = union_all(f"""SELECT * FROM (SELECT topic_id, updates, comments, last_at, {key} AS sort_key FROM {{s}}.topic_activity
+                                       ORDER BY {key} DESC LIMIT ?1)""")
+    rows = get_conn().execute(f"{sql} ORDER BY sort_key DESC, topic_id DESC LIMIT ?1", (limit,)).fetchall()
+    return [{"topic_id": tid, "updates": u, "comments": c, "last_at": at} for tid, u, c, at, _key in rows]
+
+# ---------- Search & listing ----------
+def fts_query(text:str) -> str:
+    """Turn free sidebar input into a safe FTS5 query: every word must match (as prefix)."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join('"{}"*'.format(w) for w in words)
+
+# One row per matching topic: best bm25 rank (lower = better) over title/description, updates
+# and comments, together with the snippet of that best hit (SQLite bare column semantics of MIN()).
+# {s} is the store searched.
+SEARCH_HITS_SQL = """
+    SELECT topic_id, MIN(rank) AS rank, snip FROM (
+        SELECT rowid AS topic_id, bm25(topics_fts, 10.0, 1.0) AS rank,
+               snippet(topics_fts, -1, '**', '**', '…', 12) AS snip
+          FROM {s}.topics_fts WHERE topics_fts MATCH ?
+        UNION ALL
+        SELECT u.topic_id, bm25(updates_fts) + 1.0, 'Update: ' || snippet(updates_fts, 0, '**', '**', '…', 12)
+          FROM {s}.updates_fts JOIN {s}.updates u ON u.id = updates_fts.rowid WHERE updates_fts MATCH ?
+        UNION ALL
+        SELECT c.topic_id, bm25(comments_fts) + 1.0, 'Kommentar: ' || snippet(comments_fts, 0, '**', '**', '…', 12)
+          FROM {s}.comments_fts JOIN {s}.comments c ON c.id = comments_fts.rowid WHERE comments_fts MATCH ?
+    ) GROUP BY topic_id
+"""
+
+@cached
+def search_hits(q:str, archived_only:bool=False) -> tuple[list, list, list]:
+    """Full-text hits of the sidebar search in one store: (topic ids, bm25 ranks, snippets),
+    best first. Empty lists if q contains no searchable word."""
+    match = fts_query(q)
+    if not match:
+        return [], [], []
+    store = "cold" if archived_only else "main"
+    rows = get_conn().execute(f"SELECT topic_id, rank, snip FROM ({SEARCH_HITS_SQL.format(s=store)}) ORDER BY rank, topic_id",
+                              (match, match, match)).fetchall()
+    return [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+
+TOPIC_FRAME_COLS = ["id","Titel","Beschreibung","Kategorie","Autor","Erstellt am","archived_at","Treffer"]
+
+def _topics_query(filters:dict, select:str):
+    """FROM/WHERE part shared by all topic listings. Returns (sql, params, searching).
+
+    Open topics are read from the hot store only, archived ones (archived_only) from the cold
+    one. Without a search term the listing is ordered by (created_ts, id) descending; with one,
+    by (bm25 rank, id) ascending. `select` may refer to the sort key as `sort_key`."""
+    match = fts_query(filters.get("q", ""))
+    store = "cold" if filters.get("archived_only") else "main"
+    if match:
+        q = f"SELECT {select} FROM {store}.topics t JOIN ({SEARCH_HITS_SQL.format(s=store)}) h ON h.topic_id = t.id WHERE 1=1"
+        q = q.replace("sort_key", "h.rank")
+        params = [match, match, match]
+    else:
+        q = f"SELECT {select} FROM {store}.topics t WHERE 1=1".replace("sort_key", "t.created_ts")
+        params = []
+    if filters.get("categories"):
+        q += " AND t.category IN ({})".format(",".join(["?"]*len(filters["categories"])))
+        params += filters["categories"]
+    if filters.get("users"):
+        q += " AND t.created_by IN ({})".format(",".join(["?"]*len(filters["users"])))
+        params += filters["users"]
+    if filters.get("date_from"):
+        q += " AND t.created_ts >= ?"
+        params.append(day_start_epoch(filters["date_from"]))
+    if filters.get("date_to"):
+        q += " AND t.created_ts < ?"
+        params.append(day_start_epoch(filters["date_to"] + timedelta(days=1)))
+    if store == "main":
+        q += " AND t.archived_at IS NULL"  # matches the partial indexes of the hot store
+    return q, params, bool(match)
+
+def _frame_select(searching:bool) -> str:
+    snip = "h.snip" if searching else "NULL"
+    return f"t.id, t.title, t.description, t.category, t.created_by, t.created_at, t.archived_at, {snip}, sort_key"
+
+@cached
+def list_topics(filters:dict):
+    conn = get_conn()
+    q, params, searching = _topics_query(filters, _frame_select(bool(fts_query(filters.get("q", "")))))
+    q += " ORDER BY h.rank ASC, t.id ASC" if searching else " ORDER BY t.created_ts DESC, t.id DESC"
+    rows = [r[:-1] for r in conn.execute(q, params)]
+    import pandas as pd  # lazy: processes that never list topics (CLI exports, API) skip the import
+    df = pd.DataFrame(rows, columns=TOPIC_FRAME_COLS)
+    return df
+
+@cached
+def list_topic_ids(filters:dict) -> list[int]:
+    """Ids of all topics matching the filters in listing order (cheap: no text columns are read)."""
+    conn = get_conn()
+    q, params, searching = _topics_query(filters, "t.id")
+    q += " ORDER BY h.rank ASC, t.id ASC" if searching else " ORDER BY t.created_ts DESC, t.id DESC"
+    return [r[0] for r in conn.execute(q, params)]
+
+@cached
+def list_topics_page(filters:dict, limit:int=50, cursor:tuple|None=None):
+    """One page of list_topics via keyset pagination. Returns (df, next_cursor).
+
+    The cursor is the (sort key, id) of the last row of the previous page, so every page is an
+    index range scan of `limit` rows no matter how deep the user pages. next_cursor is None on
+    the last page. Topics whose created_at cannot be parsed (created_ts NULL) come last."""
+    conn = get_conn()
+    searching = bool(fts_query(filters.get("q", "")))
+    q, params, _ = _topics_query(filters, _frame_select(searching))
+    if searching:
+        if cursor:
+            q += " AND (h.rank, t.id) > (?, ?)"
+            params += list(cursor)
+        rows = conn.execute(q + " ORDER BY h.rank ASC, t.id ASC LIMIT ?", params + [limit + 1]).fetchall()
+    else:
+        rows = []
+        if not cursor or cursor[0] is not None:
+            qa, pa = q + " AND t.created_ts IS NOT NULL", list(params)
+            if cursor:
+                qa += " AND (t.created_ts, t.id) < (?, ?)"
+                pa += list(cursor)
+            rows = conn.execute(qa + " ORDER BY t.created_ts DESC, t.id DESC LIMIT ?", pa + [limit + 1]).fetchall()
+        if len(rows) <= limit:
+            qb, pb = q + " AND t.created_ts IS NULL", list(params)
+            if cursor and cursor[0] is None:
+                qb += " AND t.id < ?"
+                pb.append(cursor[1])
+            rows += conn.execute(qb + " ORDER BY t.id DESC LIMIT ?", pb + [limit + 1 - len(rows)]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1][-1], rows[-1][0]) if has_more else None
+    import pandas as pd
+    df = pd.DataFrame([r[:-1] for r in rows], columns=TOPIC_FRAME_COLS)
+    return df, next_cursor
+
+# Archive Excel export, in archive order (newest first).
+# Links keep their JSON column format ([{"label", "url"}, ...]), so the file can be re-imported.
+ARCHIVE_EXPORT_COLS = ["ID","Titel","Beschreibung","Rubrik","Autor","Eroeffnung","Archiviert_am","Links"]
+ARCHIVE_EXPORT_SQL = """SELECT t.id, t.title, t.description, t.category, t.created_by, t.created_at, t.archived_at,
+        (SELECT json_group_array(json_object('label', l.label, 'url', l.url))
+           FROM (SELECT label, url FROM cold.topic_links WHERE topic_id = t.id ORDER BY id) l)
+    FROM cold.topics t WHERE t.archived_at IS NOT NULL{where} ORDER BY t.archived_ts DESC, t.id DESC"""
+# The same order as ids only, from the archive index
+ARCHIVE_IDS_SQL = "SELECT t.id FROM cold.topics t WHERE t.archived_at IS NOT NULL ORDER BY t.archived_ts DESC, t.id DESC"
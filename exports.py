@@ -0,0 +1,357 @@
+# Qrauts AG Themensammler – Exporte (PDF, Archiv-Excel)
+import os, sys, json, types, tempfile, multiprocessing, hashlib, threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import db
+from profiling import profiler
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "themensammler_exports")
+CHUNK_SIZE = 250          # topics per rendered part
+PARALLEL_THRESHOLD = 500  # below this many topics a single process is faster than pool start-up
+CACHE_DIR = os.path.join(EXPORT_DIR, "cache")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def _count(topic_ids:list[int]|None) -> int:
+    """Number of topics an export of topic_ids (None = all, open and archived) contains."""
+    if topic_ids is None:
+        return db.get_conn().execute(f"SELECT {' + '.join(f'(SELECT COUNT(*) FROM {s}.topics)' for s in db.STORES)}").fetchone()[0]
+    sql = db.union_all("SELECT COUNT(*) FROM {s}.topics WHERE id IN (SELECT value FROM json_each(?1))")
+    return sum(r[0] for r in db.get_conn().execute(sql, (json.dumps([int(t) for t in topic_ids]),)))
+
+def _topic_rows(topic_ids:list[int]|None, chunk_size:int):
+    """Topic rows in chunks: all topics newest first from one streamed query, or the given ids
+    in their order, looked up chunk by chunk."""
+    if topic_ids is None:
+        cur = db.get_conn().execute(db.ALL_TOPICS_SQL)
+        while rows := cur.fetchmany(chunk_size):
+            yield [r[:-1] for r in rows]
+        return
+    ids = [int(t) for t in topic_ids]
+    for i in range(0, len(ids), chunk_size):
+        if rows := db.get_topics.__wrapped__(ids[i:i + chunk_size]):
+            yield rows
+
+def iter_topic_chunks(topic_ids:list[int]|None=None, chunk_size:int=CHUNK_SIZE, include_followups:bool=False):
+    """Stream export rows in chunks of plain dicts (picklable for worker processes)."""
+    # Uncached loaders: an export must not flush the interactive read cache
+    load = db.load_followups.__wrapped__ if include_followups else db.load_links.__wrapped__
+    for rows in _topic_rows(topic_ids, chunk_size):
+        details = load([r[0] for r in rows])
+        yield [{"id": tid, "title": title, "description": desc, "category": cat, "created_by": author,
+                "created_at": created_at,
+                **(details[tid] if include_followups else {"links": details[tid]})}
+               for (tid, title, desc, cat, author, created_at, _archived_at) in rows]
+
+_main_lock = threading.Lock()
+
+@contextmanager
+def spawning_workers():
+    """Wrap code that starts spawn-context worker processes (pool.submit).
+
+    A spawned worker re-executes the parent's __main__ module. Under Streamlit that is app.py,
+    i.e. the whole UI; while workers start, __main__ is swapped for an empty module. Only
+    functions of importable modules may be submitted."""
+    with _main_lock:
+        main, stub = sys.modules.get("__main__"), types.ModuleType("__main__")
+        sys.modules["__main__"] = stub
+        try:
+            yield
+        finally:
+            if sys.modules.get("__main__") is stub:  # a new script run may have installed its own meanwhile
+                sys.modules["__main__"] = main
+
+def _export_path(prefix:str) -> str:
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=".pdf", dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+def _merge(parts:list[str], path:str):
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(part)
+    with open(path, "wb") as fh:
+        writer.write(fh)
+    writer.close()
+
+@profiler.timed("export.pdf")
+def export_pdf(topic_ids:list[int]|None=None, include_followups:bool=False, path:str|None=None,
+               workers:int|None=None, progress=None) -> str:
+    """Render topics (None = all) into a PDF file on disk and return its path.
+
+    Rows are streamed from a single query. Large exports are cut into CHUNK_SIZE parts that are
+    rendered in parallel worker processes and merged; at most two parts per worker are in flight,
+    which bounds the memory of the export regardless of its size. progress(done, total) is
+    called as parts are finished."""
+    from pdf_render import render_topics  # ReportLab is only loaded once something is exported
+    total = _count(topic_ids)
+    header = (f"{db.APP_TITLE} – Export",
+              f"Erstellt am: {datetime.now(db.TZ).strftime('%Y-%m-%d %H:%M:%S %Z')} | Anzahl Themen: {total}")
+    path = path or _export_path("themensammler_")
+    chunks = iter_topic_chunks(topic_ids, CHUNK_SIZE, include_followups)
+    workers = workers or os.cpu_count() or 1
+    if total < PARALLEL_THRESHOLD or workers == 1:
+        topics = [t for chunk in chunks for t in chunk]
+        render_topics(path, topics, header)
+        if progress:
+            progress(total, total)
+        return path
+
+    parts, pending, done = [], [], 0
+
+    def finish(fut, n):
+        nonlocal done
+        fut.result()
+        done += n
+        if progress:
+            progress(done, total)
+
+    # spawn: the app process is multi-threaded (Streamlit), forking it is not safe
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            for n, chunk in enumerate(chunks):
+                part = _export_path(f"part{n:05d}_")
+                parts.append(part)
+                with spawning_workers():
+                    future = pool.submit(render_topics, part, chunk, header if n == 0 else None)
+                pending.append((future, len(chunk)))
+                if len(pending) >= 2 * workers:
+                    finish(*pending.pop(0))
+            for fut, n in pending:
+                finish(fut, n)
+        _merge(parts, path)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return path
+
+def build_pdf(selected_ids:list[int], include_followups:bool=False) -> bytes:
+    """PDF of the selected topics (all topics if the selection is empty) as bytes."""
+    path = export_pdf(selected_ids or None, include_followups)
+    try:
+        with open(path, "rb") as fh:
+            return fh.read()
+    finally:
+        os.remove(path)
+
+# ---------- Archive Excel ----------
+ARCHIVE_WATERMARK_KEY = "archive_xlsx_watermark"
+
+class _StaleArchive(Exception):
+    """The rows of target no longer line up with the database; rebuild it."""
+
+def _load_watermark(target:str) -> int|None:
+    """change_log seq the previous export of target was up to date with, or None if target is
+    missing, was replaced since (e.g. by the GitHub download) or the log no longer reaches back."""
+    try:
+        wm = json.loads(db.get_setting(ARCHIVE_WATERMARK_KEY, "") or "null")
+        st = os.stat(target)
+    except (ValueError, OSError):
+        return None
+    if not wm or wm.get("path") != os.path.abspath(target) or wm.get("mtime") != st.st_mtime_ns or wm.get("size") != st.st_size:
+        return None
+    upto = db.change_seq()
+    oldest = db.get_conn().execute("SELECT MIN(seq) FROM change_log").fetchone()[0] or upto + 1
+    if wm.get("seq") is None or (wm["seq"] < upto and oldest > wm["seq"] + 1):  # pruned since
+        return None
+    return wm["seq"]
+
+def _save_watermark(target:str, seq:int):
+    st = os.stat(target)
+    db.set_setting(ARCHIVE_WATERMARK_KEY, json.dumps({"seq": seq, "path": os.path.abspath(target),
+                                                      "mtime": st.st_mtime_ns, "size": st.st_size}))
+
+def _old_rows(target:str):
+    """Data rows of an earlier export of target, streamed."""
+    from openpyxl import load_workbook
+    old = load_workbook(target, read_only=True)
+    try:
+        rows = old.worksheets[0].iter_rows(values_only=True)
+        next(rows, None)  # header
+        yield from (row for row in rows if row and row[0] is not None)
+    finally:
+        old.close()
+
+def _write_archive(target:str, rows) -> None:
+    """Write rows below the header to a temporary workbook that then replaces target atomically."""
+    from openpyxl import Workbook
+    tmp = f"{target}.tmp{os.getpid()}.xlsx"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(db.ARCHIVE_EXPORT_COLS)
+    try:
+        for row in rows:
+            ws.append(list(row))
+        wb.save(tmp)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _merge_archive(target:str, changed:set[int]) -> dict|None:
+    """Rewrite target with the changed topics re-read from the database, or return None if none
+    of them touches the file. Unchanged rows are streamed over from target; the database only
+    supplies the archive order (an index scan over ids), so re-read rows land where a rebuild
+    puts them."""
+    conn = db.get_conn()
+    ids = (json.dumps(sorted(changed)),)
+    fresh = {r[0]: r for r in conn.execute(db.ARCHIVE_EXPORT_SQL.format(where=" AND t.id IN (SELECT value FROM json_each(?))"), ids)}
+    if not fresh and not any(row[0] in changed for row in _old_rows(target)):
+        return None  # only open topics changed
+    dropped = set()
+
+    def kept():
+        for row in _old_rows(target):
+            if row[0] in changed:
+                dropped.add(row[0])
+            else:
+                yield row
+
+    def rows():
+        old = kept()
+        try:
+            for (tid,) in conn.execute(db.ARCHIVE_IDS_SQL):
+                if tid in fresh:
+                    yield fresh[tid]
+                    continue
+                row = next(old, None)
+                if row is None or row[0] != tid:  # edited by hand, or archived while we read
+                    raise _StaleArchive
+                yield row
+            if next(old, None) is not None:
+                raise _StaleArchive
+        finally:
+            old.close()
+    _write_archive(target, rows())
+    return {"new": len(fresh.keys() - dropped), "removed": len(dropped - fresh.keys()), "full": False}
+
+@profiler.timed("export.archive_xlsx")
+def export_archive_excel(target:str="archiv.xlsx", full:bool=False) -> dict:
+    """Write archived topics (newest archive date first) to target.
+
+    Incrementally, only the topics touched in the change log since the previous export are read
+    from the database: rows of topics restored or deleted since are dropped, still archived ones
+    are (re)written at their place in the archive order, whatever their Archiviert_am (imports
+    and sync_archive bring older ones), and all other rows are streamed over from the old
+    workbook. Both workbooks are handled in openpyxl's streaming modes and the result replaces
+    target atomically, so memory stays flat and readers never see a half-written file. With
+    full=True (or when target/watermark do not match) the file is rebuilt from the database.
+    Returns {"new": topics added to the file, "removed": topics dropped from it, "full": whether
+    it was a rebuild}."""
+    seq = None if full else _load_watermark(target)
+    if seq is not None:
+        # A renamed or deleted Rubrik changes the rows of all its topics
+        if not db.get_conn().execute("SELECT 1 FROM change_log WHERE seq > ? AND tbl = 'categories' AND op <> 'insert'",
+                                     (seq,)).fetchone():
+            changed, upto = db.changed_topic_ids(seq)
+            try:
+                result = _merge_archive(target, changed) if changed else None
+            except _StaleArchive:
+                pass
+            else:
+                _save_watermark(target, upto)
+                return result or {"new": 0, "removed": 0, "full": False}
+    upto = db.change_seq()
+    n = 0
+
+    def rows():
+        nonlocal n
+        for row in db.get_conn().execute(db.ARCHIVE_EXPORT_SQL.format(where="")):
+            n += 1
+            yield row
+    _write_archive(target, rows())
+    _save_watermark(target, upto)
+    return {"new": n, "removed": 0, "full": True}
+
+# ---------- Export cache ----------
+class ExportCache:
+    """Content-addressed store for generated export files with size-based LRU eviction.
+
+    Files are named after a hash of what went into them, so an unchanged selection is served
+    from disk. Concurrent requests for the same key wait for the one render in progress
+    instead of starting their own. Recency is tracked via the file mtime."""
+    def __init__(self, directory:str=CACHE_DIR, max_bytes:int=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_render(self, key:str, suffix:str, render) -> str:
+        """Path of the cached file for key; render(tmp_path) produces it on a miss."""
+        path = os.path.join(self.directory, key + suffix)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if os.path.exists(path):
+                os.utime(path)
+                self.hits += 1
+                return path
+            self.misses += 1
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = os.path.join(self.directory, f"{key}.tmp{os.getpid()}-{threading.get_ident()}{suffix}")  # unique across processes
+            try:
+                render(tmp)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep:str|None=None):
+        # Every app process on the host shares the directory; another one may evict the same
+        # files between listdir() and stat()/remove()
+        entries = []
+        for name in os.listdir(self.directory):
+            p = os.path.join(self.directory, name)
+            if ".tmp" in name:
+                continue
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(e[1] for e in entries)
+        for _mtime, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if p != keep:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+export_cache = ExportCache()
+
+def content_fingerprint(topic_ids:list[int]|None, include_followups:bool=False) -> str:
+    """Hash of every row an export would contain, in export order.
+
+    Reading the rows is cheap compared to rendering them; any change to a topic, its links or
+    (if included) its follow-ups yields a different fingerprint and thus a new cache entry.
+    The export of all topics is keyed by the change-log position instead, which needs no scan;
+    the cache directory is shared by every database on the host, so that key names the database."""
+    if topic_ids is None:
+        return hashlib.sha256(f"all:{include_followups}:{db.database_id()}:{db.change_seq()}".encode()).hexdigest()
+    h = hashlib.sha256()
+    for chunk in iter_topic_chunks(topic_ids, CHUNK_SIZE, include_followups):
+        h.update(repr(chunk).encode())
+    return h.hexdigest()
+
+@profiler.timed("export.pdf_cached")
+def cached_export_pdf(topic_ids:list[int]|None=None, include_followups:bool=False, progress=None) -> str:
+    """export_pdf through the export cache. The returned file belongs to the cache: do not delete it."""
+    key = "pdf-" + content_fingerprint(topic_ids, include_followups)
+    return export_cache.get_or_render(key, ".pdf", lambda tmp: export_pdf(topic_ids, include_followups, path=tmp, progress=progress))
@@ -0,0 +1,142 @@
+# Qrauts AG Themensammler – Excel-Import (Bulk, streaming)
+import json
+import pandas as pd
+
+import db
+from profiling import profiler
+
+IMPORT_COLUMNS = {"Titel","Beschreibung","Rubrik","Autor","Eroeffnung"}
+INSERT_SQL = """INSERT INTO topics(title, description, category, created_by, created_at, archived_at)
+                VALUES(?,?,?,?,?,?)"""
+LINK_INSERT_SQL = "INSERT INTO topic_links(topic_id, label, url) VALUES(?,?,?)"
+
+def iter_workbook_chunks(source, chunk_size:int=5000):
+    """Yield (DataFrame, total_rows) chunks of the first sheet without loading the whole workbook.
+
+    openpyxl's read-only mode parses the sheet XML lazily, so memory is bounded by chunk_size
+    rows. total_rows comes from the sheet dimension and may be None for unusual files."""
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h).strip() if h is not None else "" for h in header]
+        missing = IMPORT_COLUMNS - set(columns)
+        if missing:
+            raise ValueError(f"Fehlende Spalten. Erwartet: {', '.join(sorted(IMPORT_COLUMNS))}")
+        total = ws.max_row - 1 if ws.max_row else None
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns), total
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns), total
+    finally:
+        wb.close()
+
+def _text(col:pd.Series) -> pd.Series:
+    return col.astype("string").fillna("").str.strip()
+
+def normalize_timestamps(col:pd.Series, fill_empty:bool=True) -> pd.Series:
+    """ISO timestamps with Berlin offset, like now_iso(). Values without an offset (Excel dates,
+    naive strings) are read as Berlin local time; unparseable text is kept as it is, empty cells
+    get the import time (or None with fill_empty=False)."""
+    raw = _text(col.map(lambda v: v.isoformat(sep=" ") if hasattr(v, "isoformat") else v))
+    has_tz = raw.str.contains(r"(?:[+-]\d{2}:?\d{2}|Z)$", regex=True)
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype=f"datetime64[ns, {db.TZ.key}]")
+    if has_tz.any():
+        parsed[has_tz] = pd.to_datetime(raw[has_tz], errors="coerce", utc=True, format="mixed").dt.tz_convert(db.TZ)
+    naive = ~has_tz & (raw != "")
+    if naive.any():
+        local = pd.to_datetime(raw[naive], errors="coerce", format="mixed")
+        parsed[naive] = local.dt.tz_localize(db.TZ, ambiguous="NaT", nonexistent="shift_forward")
+    iso = parsed.dt.strftime("%Y-%m-%dT%H:%M:%S%z").str.replace(r"(\d{2})(\d{2})$", r"\1:\2", regex=True)
+    out = iso.where(parsed.notna(), raw)
+    return out.where(out != "", db.now_iso() if fill_empty else None)
+
+def _parse_links(value) -> list[tuple[str, str]]:
+    """(label, url) pairs from the Links JSON cell; malformed cells and entries without url are ignored."""
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == "":
+        return []
+    try:
+        links = json.loads(value) if isinstance(value, str) else value
+    except Exception:
+        return []
+    if not isinstance(links, list):
+        return []
+    pairs = []
+    for l in links:
+        url = str(l.get("url") or "").strip() if isinstance(l, dict) else ""
+        if url:
+            pairs.append((str(l.get("label") or "").strip() or url, url))
+    return pairs
+
+def normalize_chunk(raw:pd.DataFrame) -> pd.DataFrame:
+    """Map the Excel columns to topic columns; rows without a title are dropped.
+
+    An Archiviert_am column (as written by the archive export) imports the rows as archived."""
+    df = pd.DataFrame({
+        "title": _text(raw["Titel"]),
+        "description": _text(raw["Beschreibung"]),
+        "category": _text(raw["Rubrik"]),
+        "created_by": _text(raw["Autor"]),
+        "created_at": normalize_timestamps(raw["Eroeffnung"]),
+        "archived_at": normalize_timestamps(raw["Archiviert_am"], fill_empty=False) if "Archiviert_am" in raw.columns else None,
+        "links": raw["Links"].map(_parse_links) if "Links" in raw.columns else None,
+    })
+    df = df[df["title"] != ""]
+    df["category"] = df["category"].where(df["category"] != "", None)
+    df["created_by"] = df["created_by"].where(df["created_by"] != "", db.USERS[0])
+    return df
+
+def _existing_keys(conn, titles:pd.Series) -> set:
+    rows = conn.execute(db.union_all("SELECT title, created_at FROM {s}.topics WHERE title IN (SELECT value FROM json_each(?1))"),
+                        (json.dumps(titles.unique().tolist(), ensure_ascii=False),))
+    return set(rows)
+
+@profiler.timed("import.excel")
+def import_excel(source, chunk_size:int=5000, progress=None) -> dict:
+    """Bulk-import topics from an Excel file (columns see IMPORT_COLUMNS, plus optional Links JSON).
+
+    All chunks are written in one transaction with executemany, created_at is inserted directly,
+    missing categories are upserted per chunk, and rows whose (title, created_at) already exists in
+    the database (open or archived) or earlier in the file are skipped as duplicates. Archived rows
+    are moved to the cold store at the end. progress(done, total) is called
+    after every chunk."""
+    stats = {"imported": 0, "duplicates": 0, "skipped": 0, "categories_added": 0}
+    done = 0
+    with db.transaction() as conn:
+        for raw, total in iter_workbook_chunks(source, chunk_size):
+            df = normalize_chunk(raw)
+            stats["skipped"] += len(raw) - len(df)
+            before = len(df)
+            df = df.drop_duplicates(["title", "created_at"])
+            existing = _existing_keys(conn, df["title"])
+            if existing:
+                keys = pd.MultiIndex.from_frame(df[["title", "created_at"]])
+                df = df[~keys.isin(list(existing))]
+            stats["duplicates"] += before - len(df)
+            cats = df["category"].dropna().unique().tolist()
+            if cats:
+                n_before = conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+                conn.executemany("INSERT OR IGNORE INTO categories(name) VALUES(?)", [(c,) for c in cats])
+                stats["categories_added"] += conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0] - n_before
+            topics = df.drop(columns="links")
+            conn.executemany(INSERT_SQL, topics.astype(object).where(topics.notna(), None).itertuples(index=False, name=None))
+            if len(df) and df["links"].notna().any():
+                # The write transaction is exclusive and ids are AUTOINCREMENT, so the chunk's rows
+                # are the newest len(df) topics, in insertion order
+                ids = [r[0] for r in conn.execute("SELECT id FROM topics ORDER BY id DESC LIMIT ?", (len(df),))][::-1]
+                conn.executemany(LINK_INSERT_SQL, ((tid, label, url) for tid, links in zip(ids, df["links"])
+                                                   for label, url in (links or ())))
+            stats["imported"] += len(df)
+            done += len(raw)
+            if progress:
+                progress(done, total)
+        db.sweep_archived()  # imported archive rows belong in the cold store
+    return stats
@@ -0,0 +1,182 @@
+# Qrauts AG Themensammler – Hintergrund-Aufträge (PDF-Export, Import, Archiv)
+import os, json, time, hashlib, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import db
+from exports import EXPORT_DIR, spawning_workers
+
+JOB_WORKERS = int(os.environ.get("THEMENSAMMLER_JOB_WORKERS", "2"))
+UPLOAD_DIR = os.path.join(EXPORT_DIR, "uploads")
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes (each write invalidates the read cache)
+KEEP_DAYS = 7
+MAINTENANCE_DAYS = 7         # db.maintenance() is due after this many days
+MAINTENANCE_CHECK = 3600.0   # seconds between due checks of one process
+ACTIVE = ("queued", "running")
+
+def job_key(kind:str, params:dict) -> str:
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+def stage_upload(data:bytes) -> str:
+    """Store an uploaded file for an import job; the name is its content hash, so the same file
+    uploaded twice maps to the same job parameters."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, hashlib.sha256(data).hexdigest() + ".xlsx")
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    return path
+
+# ---------- Job functions (run in the worker processes) ----------
+def _pdf(params, progress):
+    from exports import cached_export_pdf
+    return {"path": cached_export_pdf(params["ids"], params["followups"], progress=progress)}
+
+def _import(params, progress):
+    from importer import import_excel
+    try:
+        return import_excel(params["path"], progress=progress)
+    finally:
+        if os.path.exists(params["path"]):
+            os.remove(params["path"])
+
+def _archive_export(params, progress):
+    from exports import export_archive_excel
+    return export_archive_excel(params["target"], params["full"])
+
+def _archive_sync(params, progress):
+    from archive_sync import sync_archive
+    return sync_archive(params["url"], params["target"])
+
+def _maintenance(params, progress):
+    return db.maintenance(params["vacuum"])
+
+JOB_KINDS = {"pdf": _pdf, "import": _import, "archive_export": _archive_export, "archive_sync": _archive_sync,
+             "maintenance": _maintenance}
+
+def _update(job_id:int, **fields):
+    cols = ", ".join(f"{k}=?" for k in fields)
+    with db.transaction() as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+def run_job(job_id:int):
+    """Execute a queued job. Status, throttled progress and the result are written to its record."""
+    kind, params = db.get_conn().execute("SELECT kind, params FROM jobs WHERE id=?", (job_id,)).fetchone()
+    _update(job_id, status="running", started_at=db.now_iso())
+    last = 0.0
+
+    def progress(done, total):
+        nonlocal last
+        if total and time.monotonic() - last >= PROGRESS_INTERVAL:
+            last = time.monotonic()
+            _update(job_id, progress=min(done / total, 1.0))
+    try:
+        result = JOB_KINDS[kind](json.loads(params), progress)
+    except Exception as e:
+        _update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=db.now_iso())
+    else:
+        _update(job_id, status="done", progress=1.0, result=json.dumps(result, ensure_ascii=False, default=str),
+                finished_at=db.now_iso())
+
+# ---------- Queue ----------
+def _alive(pid:int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobQueue:
+    """Runs jobs in a bounded pool of worker processes; the job records live in SQLite.
+
+    The work happens outside the Streamlit process, so long exports neither block the session
+    that started them nor hold the GIL other sessions need for their reruns. Submitting a job
+    whose kind and parameters match a queued or running one returns that job instead."""
+    def __init__(self, workers:int=JOB_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self._next_maintenance_check = 0.0
+
+    def _executor(self):
+        if self._pool is None:
+            self.recover()
+            # spawn: the app process is multi-threaded (Streamlit), forking it is not safe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def submit(self, kind:str, params:dict, user:str|None=None) -> int:
+        """Queue a job and return its id (the id of an identical active job, if there is one)."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unbekannte Auftragsart: {kind}")
+        key = job_key(kind, params)
+        with self._lock:
+            pool = self._executor()
+            with db.transaction() as conn:
+                row = conn.execute("SELECT id FROM jobs WHERE key=? AND status IN ('queued', 'running')", (key,)).fetchone()
+                if row:
+                    return row[0]
+                job_id = conn.execute("""INSERT INTO jobs(kind, key, params, status, created_by, created_at, owner)
+                                         VALUES(?,?,?,'queued',?,?,?)""",
+                                      (kind, key, json.dumps(params, ensure_ascii=False), user, db.now_iso(), os.getpid())).lastrowid
+            with spawning_workers():
+                try:
+                    future = pool.submit(run_job, job_id)
+                except BrokenProcessPool:  # a worker died earlier: start a fresh pool
+                    self._pool = None
+                    future = self._executor().submit(run_job, job_id)
+            future.add_done_callback(lambda f: self._finished(job_id, f))
+        return job_id
+
+    def _finished(self, job_id:int, future):
+        # run_job records its own outcome; only a dying worker process leaves the record active
+        if future.cancelled() or future.exception() is not None:
+            error = "abgebrochen" if future.cancelled() else f"{type(future.exception()).__name__}: {future.exception()}"
+            with db.transaction() as conn:
+                conn.execute("UPDATE jobs SET status='failed', error=?, finished_at=? WHERE id=? AND status IN ('queued', 'running')",
+                             (error, db.now_iso(), job_id))
+
+    def recover(self):
+        """Fail jobs whose owning process is gone (e.g. after a restart) and drop old records."""
+        cutoff = (datetime.now(db.TZ) - timedelta(days=KEEP_DAYS)).isoformat(timespec="seconds")
+        with db.transaction() as conn:
+            active = conn.execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            dead = [jid for jid, owner in active if owner != os.getpid() and not (owner and _alive(owner))]
+            if dead:
+                conn.execute("""UPDATE jobs SET status='failed', error='abgebrochen (Neustart)', finished_at=?
+                                WHERE id IN (SELECT value FROM json_each(?))""", (db.now_iso(), json.dumps(dead)))
+            conn.execute("DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?", (cutoff,))
+
+    def maintain_if_due(self) -> int|None:
+        """Submit the maintenance job if its last run is older than MAINTENANCE_DAYS. Cheap enough
+        to call on every rerun: the setting is read at most every MAINTENANCE_CHECK seconds.
+
+        Runs without VACUUM, which rewrites both files under an exclusive lock and would stall
+        the users who happen to be on the page; that stays with the manual button and cli.py."""
+        if time.monotonic() < self._next_maintenance_check:
+            return None
+        self._next_maintenance_check = time.monotonic() + MAINTENANCE_CHECK
+        last = db.get_setting(db.MAINTENANCE_KEY, "")
+        if last and datetime.fromisoformat(last) > datetime.now(db.TZ) - timedelta(days=MAINTENANCE_DAYS):
+            return None
+        return self.submit("maintenance", {"vacuum": False})
+
+    def get(self, job_ids:list[int]) -> list[dict]:
+        """Job records for the given ids (in that order), results decoded."""
+        cols = ["id", "kind", "params", "status", "progress", "result", "error", "created_by", "created_at", "finished_at"]
+        rows = db.get_conn().execute(f"SELECT {', '.join(cols)} FROM jobs WHERE id IN (SELECT value FROM json_each(?))",
+                                     (json.dumps([int(j) for j in job_ids]),)).fetchall()
+        by_id = {}
+        for row in rows:
+            job = dict(zip(cols, row))
+            job["params"] = json.loads(job["params"] or "{}")
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+            by_id[job["id"]] = job
+        return [by_id[j] for j in job_ids if j in by_id]
+
+job_queue = JobQueue()
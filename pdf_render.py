@@ -0,0 +1,63 @@
+# Qrauts AG Themensammler – PDF-Rendering (nur ReportLab, läuft auch in Worker-Prozessen)
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import cm
+from reportlab.lib import utils
+
+def render_topics(path:str, topics:list[dict], header:tuple[str, str]|None=None) -> str:
+    """Render topics into a PDF file at path and return the path.
+
+    Each topic is a dict with id, title, description, category, created_by, created_at,
+    links (list of {label, url}) and optionally updates/comments as (user, content, created_at)
+    tuples. header=(title, subtitle) is drawn on top of the first page; parts of a parallel
+    export pass None so that only the first part carries it."""
+    c = canvas.Canvas(path, pagesize=A4)
+    width, height = A4
+    margin = 2*cm
+    y = height - margin
+
+    def write_line(text, font="Helvetica", size=10, leading=12):
+        nonlocal y
+        c.setFont(font, size)
+        wrapped = utils.simpleSplit(text, font, size, width - 2*margin)
+        for line in wrapped:
+            if y < margin + leading:
+                c.showPage()
+                y = height - margin
+                c.setFont(font, size)
+            c.drawString(margin, y, line)
+            y -= leading
+
+    if header:
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(margin, y, header[0])
+        y -= 18
+        c.setFont("Helvetica", 9)
+        c.drawString(margin, y, header[1])
+        y -= 16
+        c.line(margin, y, width - margin, y)
+        y -= 14
+
+    for t in topics:
+        write_line(f"#{t['id']}  {t['title']}", "Helvetica-Bold", 12, 14)
+        write_line(f"Rubrik: {t['category']}   |   Autor: {t['created_by']}   |   Eröffnung: {t['created_at']}", "Helvetica", 9, 12)
+        if t["description"]:
+            write_line("Beschreibung:", "Helvetica-Bold", 10, 12)
+            write_line(t["description"], "Helvetica", 10, 12)
+        if t["links"]:
+            write_line("Links:", "Helvetica-Bold", 10, 12)
+            for l in t["links"]:
+                write_line(f"• {l.get('label')}: {l.get('url')}", "Helvetica", 9, 12)
+        for label, kind in (("Updates:", "updates"), ("Kommentare:", "comments")):
+            if t.get(kind):
+                write_line(label, "Helvetica-Bold", 10, 12)
+                for user, content, created_at in t[kind]:
+                    write_line(f"• {created_at} – {user}: {content}", "Helvetica", 9, 12)
+        y -= 6
+        c.setStrokeColorRGB(0.7,0.82,0.74)
+        c.line(margin, y, width - margin, y)
+        y -= 16
+        c.setStrokeColorRGB(0,0,0)
+
+    c.save()
+    return path
@@ -0,0 +1,198 @@
+# Qrauts AG Themensammler – Messung der Hot Paths (SQL, Exporte, Render-Abschnitte)
+import os, json, math, time, logging, threading, functools, sqlite3
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+LOG_PATH = os.environ.get("THEMENSAMMLER_PROFILE_LOG", "themensammler_profile.jsonl")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+SAMPLES_PER_OP = 1000  # the percentiles are computed over the most recent samples of an operation
+
+def _sql_op(sql:str) -> str:
+    """Operation name of a statement: its text with whitespace collapsed, shortened."""
+    text = " ".join(sql.split())
+    return "sql: " + (text if len(text) <= 120 else text[:117] + "...")
+
+class Profiler:
+    """Collects timings of named operations: percentiles in memory, every event in a rotating JSONL log.
+
+    Disabled, every hook reduces to one attribute check. Statements slower than slow_ms are logged
+    together with their EXPLAIN QUERY PLAN."""
+    def __init__(self, enabled:bool=False, slow_ms:float=50.0, log_path:str=LOG_PATH):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self._samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_OP))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+        self._log = None
+
+    def _logger(self):
+        if self._log is None:
+            log = logging.getLogger("themensammler.profile")
+            log.propagate = False
+            log.setLevel(logging.INFO)
+            handler = RotatingFileHandler(self.log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            log.addHandler(handler)
+            self._log = log
+        return self._log
+
+    def record(self, op:str, ms:float, **fields):
+        with self._lock:
+            self._samples[op].append(ms)
+            self._counts[op] += 1
+        event = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), "op": op, "ms": round(ms, 3),
+                 "thread": threading.current_thread().name, **fields}
+        self._logger().info(json.dumps(event, ensure_ascii=False, default=str))
+
+    @contextmanager
+    def span(self, op:str, **fields):
+        """Time the with-block as op (nothing is recorded while disabled)."""
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(op, (time.perf_counter() - t0) * 1000, **fields)
+
+    def timed(self, op:str):
+        """Decorator form of span()."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(op):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def clock(self):
+        """Start mark for code that cannot be wrapped in a with-block (e.g. module-level script parts)."""
+        return time.perf_counter() if self.enabled else None
+
+    def since(self, op:str, mark, **fields):
+        """Record the time elapsed since mark = clock(); no-op if profiling was off at the mark."""
+        if mark is not None:
+            self.record(op, (time.perf_counter() - mark) * 1000, **fields)
+
+    def stats(self) -> list[dict]:
+        """count, p50, p95 and max per operation (over the retained samples), slowest p95 first."""
+        with self._lock:
+            items = [(op, self._counts[op], sorted(s)) for op, s in self._samples.items() if s]
+        pct = lambda s, q: s[max(0, math.ceil(q * len(s)) - 1)]  # nearest rank
+        rows = [{"op": op, "count": count, "p50_ms": pct(s, 0.5), "p95_ms": pct(s, 0.95), "max_ms": s[-1]}
+                for op, count, s in items]
+        return sorted(rows, key=lambda r: r["p95_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+profiler = Profiler(enabled=os.environ.get("THEMENSAMMLER_PROFILE", "") not in ("", "0"),
+                    slow_ms=float(os.environ.get("THEMENSAMMLER_SLOW_MS", "50")))
+
+# ---------- SQL ----------
+class _TimedCursor:
+    """Cursor proxy that adds the fetch time to the execute time and counts the rows.
+
+    The statement is recorded once the cursor is exhausted or dropped, so results that are
+    streamed with fetchmany()/iteration stay streamed."""
+    __slots__ = ("_conn", "_cur", "_sql", "_params", "_ms", "_rows", "_done")
+
+    def __init__(self, conn, cur, sql, params, ms):
+        self._conn, self._cur, self._sql, self._params = conn, cur, sql, params
+        self._ms, self._rows, self._done = ms, 0, False
+
+    def _fetch(self, fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        self._ms += (time.perf_counter() - t0) * 1000
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self._cur.fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(self._cur.fetchmany, size or self._cur.arraysize)
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cur.fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        while rows := self.fetchmany(256):
+            yield from rows
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _finish(self):
+        if self._done:
+            return
+        self._done = True
+        rows = self._rows if self._cur.description is not None else self._cur.rowcount
+        fields = {"rows": rows}
+        if self._ms >= profiler.slow_ms:
+            fields.update(slow=True, sql=self._sql, plan=self._conn.query_plan(self._sql, self._params))
+        profiler.record(_sql_op(self._sql), self._ms, **fields)
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose execute/executemany/commit are timed while the profiler is enabled."""
+    def execute(self, sql, params=()):
+        if not profiler.enabled:
+            return super().execute(sql, params)
+        t0 = time.perf_counter()
+        cur = super().execute(sql, params)
+        return _TimedCursor(self, cur, sql, params, (time.perf_counter() - t0) * 1000)
+
+    def executemany(self, sql, seq):
+        if not profiler.enabled:
+            return super().executemany(sql, seq)
+        t0 = time.perf_counter()
+        cur = super().executemany(sql, seq)
+        ms = (time.perf_counter() - t0) * 1000
+        fields = {"rows": cur.rowcount}
+        if ms >= profiler.slow_ms:
+            fields.update(slow=True, sql=sql)
+        profiler.record(_sql_op(sql), ms, **fields)
+        return cur
+
+    def commit(self):
+        if not profiler.enabled:
+            return super().commit()
+        t0 = time.perf_counter()
+        super().commit()
+        profiler.record("sql: COMMIT", (time.perf_counter() - t0) * 1000)
+
+    def query_plan(self, sql, params=()) -> list[str]|None:
+        """EXPLAIN QUERY PLAN rows of a statement as 'id parent detail' strings (None if not explainable)."""
+        if sql.lstrip()[:6].upper() not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
+            return None
+        try:
+            return [f"{r[0]} {r[1]} {r[3]}" for r in super().execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error:
+            return None
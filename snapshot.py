@@ -0,0 +1,215 @@
+# Qrauts AG Themensammler – Spaltenweiser Themen-Snapshot für die Filter der Übersicht
+import json, threading
+from datetime import timedelta
+from typing import NamedTuple
+
+import numpy as np
+
+import db
+
+NULL_TS = np.iinfo(np.int64).min  # created_ts NULL (unparseable created_at): sorts last, matches no date filter
+PATCH_LIMIT = 5000                # more changed topics than this: reloading is cheaper than patching
+HIT_CACHE_SIZE = 32               # search terms whose hits are kept as arrays
+
+# Filter metadata of every topic in both stores; cold = archived (archived_at, not the store: a
+# topic is in both files for a moment while it moves, and then the hot row is the current one)
+_META_SQL = """SELECT t.id, t.created_ts, t.category, t.created_by, t.archived_at IS NOT NULL, a.last_ts
+    FROM {s}.topics t LEFT JOIN {s}.topic_activity a ON a.topic_id = t.id"""
+
+class Columns(NamedTuple):
+    """One immutable state of the snapshot, rows in listing order (created_ts, id descending)."""
+    ids: np.ndarray         # int64
+    ts: np.ndarray          # int64 epochs, NULL_TS for NULL
+    cat: np.ndarray         # int32 codes into cat_codes, -1 for NULL
+    author: np.ndarray      # int32 codes into author_codes, -1 for NULL
+    cold: np.ndarray        # bool
+    activity: np.ndarray    # int64 epochs of the last activity (topic_activity.last_ts), NULL_TS for NULL
+    sorted_ids: np.ndarray  # ids ascending ...
+    by_id: np.ndarray       # ... and their positions in the listing order
+    by_activity: np.ndarray # positions in the order of the last activity (activity, id descending)
+    cat_codes: dict
+    author_codes: dict
+
+def _encode(values:list, codes:dict) -> np.ndarray:
+    """Dictionary-encode values; unseen names are added to codes."""
+    out = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        out[i] = -1 if v is None else codes.setdefault(v, len(codes))
+    return out
+
+def _member(codes:np.ndarray, names:dict, selected:list) -> np.ndarray:
+    """Mask of the rows whose code is one of the selected names (lookup table, one gather)."""
+    lut = np.zeros(len(names) + 1, dtype=bool)  # the extra last slot is hit by -1 (NULL) and stays False
+    for name in selected:
+        if name in names:
+            lut[names[name]] = True
+    return lut[codes]
+
+class TopicSnapshot:
+    """Per-process columnar copy of the topic metadata the sidebar filters work on.
+
+    Filters become boolean masks over NumPy arrays instead of SQL round trips; full rows are
+    loaded only for the page shown (db.get_topics). The snapshot is loaded once and then patched
+    with the topics the change log reports as changed, whenever the data version has moved.
+    Free-text search still asks the FTS index, once per term (db.search_hits is cached)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._seq = 0
+        self._cols = None
+        self._hit_cache = {}
+        self.loads = 0
+        self.patches = 0
+
+    def columns(self) -> Columns:
+        version = db.data_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._update()
+                    self._version = version
+        return self._cols
+
+    def _update(self):
+        # A new Rubrik changes no topic; a renamed or deleted one rewrites the category of all its topics
+        if self._cols is not None and not db.get_conn().execute(
+                "SELECT 1 FROM change_log WHERE seq > ? AND tbl = 'categories' AND op <> 'insert'", (self._seq,)).fetchone():
+            changed, seq = db.changed_topic_ids(self._seq)
+            if len(changed) <= PATCH_LIMIT:
+                if changed:
+                    self._patch(changed)
+                self._seq = seq
+                return
+        # First load, or categories renamed/deleted (deleted names are set to NULL in both stores)
+        seq = db.change_seq()
+        rows = db.get_conn().execute(db.union_all(_META_SQL)).fetchall()
+        self._cols = self._build(rows, np.empty(0, dtype=bool), None, {}, {})
+        self._seq = seq
+        self.loads += 1
+
+    def _patch(self, changed:set):
+        cols = self._cols
+        ids = json.dumps(sorted(changed))
+        rows = db.get_conn().execute(db.union_all(_META_SQL + " WHERE t.id IN (SELECT value FROM json_each(?1))"), (ids,)).fetchall()
+        keep = ~np.isin(cols.ids, np.fromiter(changed, dtype=np.int64, count=len(changed)))
+        self._cols = self._build(rows, keep, cols, dict(cols.cat_codes), dict(cols.author_codes))
+        self.patches += 1
+
+    @staticmethod
+    def _build(rows:list, keep:np.ndarray, old:Columns|None, cat_codes:dict, author_codes:dict) -> Columns:
+        """Columns of rows, plus the kept rows of old, in listing order."""
+        if len({r[0] for r in rows}) < len(rows):  # mid-move: keep the first (hot) row of each id
+            rows = list({r[0]: r for r in reversed(rows)}.values())
+        n = len(rows)
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        ts = np.fromiter((NULL_TS if r[1] is None else r[1] for r in rows), dtype=np.int64, count=n)
+        cat = _encode([r[2] for r in rows], cat_codes)
+        author = _encode([r[3] for r in rows], author_codes)
+        cold = np.fromiter((bool(r[4]) for r in rows), dtype=bool, count=n)
+        activity = np.fromiter((NULL_TS if r[5] is None else r[5] for r in rows), dtype=np.int64, count=n)
+        if old is not None:
+            ids, ts, cat, author, cold, activity = (
+                np.concatenate([prev[keep], new]) for prev, new in
+                zip((old.ids, old.ts, old.cat, old.author, old.cold, old.activity), (ids, ts, cat, author, cold, activity)))
+        order = np.lexsort((ids, ts))[::-1]  # created_ts, id descending; NULL_TS is the minimum and ends up last
+        ids, ts, cat, author, cold, activity = ids[order], ts[order], cat[order], author[order], cold[order], activity[order]
+        by_id = np.argsort(ids, kind="stable")
+        by_activity = np.lexsort((ids, activity))[::-1]
+        return Columns(ids, ts, cat, author, cold, activity, ids[by_id], by_id, by_activity, cat_codes, author_codes)
+
+    def _mask(self, cols:Columns, filters:dict) -> np.ndarray:
+        """Same semantics as db._topics_query."""
+        m = cols.cold == bool(filters.get("archived_only"))
+        if filters.get("categories"):
+            m &= _member(cols.cat, cols.cat_codes, filters["categories"])
+        if filters.get("users"):
+            m &= _member(cols.author, cols.author_codes, filters["users"])
+        if filters.get("date_from"):
+            m &= cols.ts >= db.day_start_epoch(filters["date_from"])
+        if filters.get("date_to"):
+            m &= (cols.ts < db.day_start_epoch(filters["date_to"] + timedelta(days=1))) & (cols.ts != NULL_TS)
+        return m
+
+    def _hits(self, cols:Columns, q:str, archived_only:bool):
+        """FTS hits of q as arrays (ids, ranks, snippets) plus their positions in cols (-1: not in
+        the snapshot). Kept while cols is current, so changing other filters around a search
+        costs neither a query nor a conversion."""
+        key = (db.fts_query(q), archived_only)
+        hits = self._hit_cache.get(key)
+        if hits is None or hits[-1] is not cols:
+            ids, ranks, snips = db.search_hits(q, archived_only)
+            ids = np.asarray(ids, dtype=np.int64)
+            pos = np.full(len(ids), -1, dtype=np.int64)
+            if len(cols.ids) and len(ids):
+                i = np.minimum(np.searchsorted(cols.sorted_ids, ids), len(cols.ids) - 1)
+                found = cols.sorted_ids[i] == ids
+                pos[found] = cols.by_id[i[found]]
+            hits = (ids, np.asarray(ranks, dtype=float), np.asarray(snips, dtype=object), pos, cols)
+            if len(self._hit_cache) >= HIT_CACHE_SIZE:
+                self._hit_cache.clear()
+            self._hit_cache[key] = hits
+        return hits
+
+    def select(self, filters:dict):
+        """Matching topics in listing order: (ids, sort keys, snippets, ranked). Without a search
+        term the keys are created_ts (descending order) and snippets is None; with one, bm25 ranks
+        (ascending, ranked=True) and the snippet of every hit. filters["order"] == "activity" sorts
+        either by the last activity instead (descending)."""
+        cols = self.columns()
+        m = self._mask(cols, filters)
+        by_activity = filters.get("order") == "activity"
+        if not db.fts_query(filters.get("q", "")):
+            if by_activity:
+                sel = cols.by_activity[m[cols.by_activity]]
+                return cols.ids[sel], cols.activity[sel], None, False
+            return cols.ids[m], cols.ts[m], None, False
+        ids, ranks, snips, pos, _ = self._hits(cols, filters["q"], bool(filters.get("archived_only")))
+        found = pos >= 0
+        found[found] = m[pos[found]]
+        if by_activity:
+            ids, keys = ids[found], cols.activity[pos[found]]
+            order = np.lexsort((ids, keys))[::-1]
+            return ids[order], keys[order], snips[found][order], False
+        return ids[found], ranks[found], snips[found], True
+
+    def page(self, filters:dict, limit:int=50, cursor:tuple|None=None):
+        """One page of the listing as in db.list_topics_page: (df, next_cursor), same cursors
+        (plus the "activity" order, which only the snapshot offers)."""
+        rows, next_cursor, _total = self.page_rows(filters, limit, cursor)
+        import pandas as pd
+        return pd.DataFrame(rows, columns=db.TOPIC_FRAME_COLS), next_cursor
+
+    def page_rows(self, filters:dict, limit:int=50, cursor:tuple|None=None):
+        """page() without the DataFrame: (rows in TOPIC_FRAME_COLS order, next_cursor, total matches).
+
+        Only the rows of the page are read from the database."""
+        ids, keys, snips, ranked = self.select(filters)
+        start = 0
+        if cursor:
+            key, cid = cursor
+            if ranked:
+                after = (keys > key) | ((keys == key) & (ids > cid))
+            else:
+                key = NULL_TS if key is None else key
+                after = (keys < key) | ((keys == key) & (ids < cid))
+            start = int(np.argmax(after)) if after.any() else len(ids)
+        end = min(start + limit, len(ids))
+        page_ids = ids[start:end].tolist()
+        hits = dict(zip(page_ids, snips[start:end])) if snips is not None else {}
+        rows = [(*row, hits.get(row[0])) for row in db.get_topics(page_ids)]
+        next_cursor = None
+        if end < len(ids):
+            last = keys[end - 1]
+            key = float(last) if ranked else (None if last == NULL_TS else int(last))
+            next_cursor = (key, int(ids[end - 1]))
+        return rows, next_cursor, len(ids)
+
+snapshot = TopicSnapshot()
+
+def list_topic_ids(filters:dict) -> list[int]:
+    """db.list_topic_ids served from the snapshot."""
+    return snapshot.select(filters)[0].tolist()
+
+def list_topics_page(filters:dict, limit:int=50, cursor:tuple|None=None):
+    """db.list_topics_page served from the snapshot."""
+    return snapshot.page(filters, limit, cursor)
@@ -0,0 +1,9 @@
+# Qrauts AG Themensammler – gemeinsame Testumgebung: eine temporäre Datenbank je Testlauf
+import os, sys, atexit, shutil, tempfile
+
+# db reads its paths on import, and a test run imports it only once for all test modules
+TMP = tempfile.mkdtemp(prefix="themensammler_test_")
+os.environ["THEMENSAMMLER_DB"] = os.path.join(TMP, "themensammler.db")
+os.environ.pop("THEMENSAMMLER_ARCHIVE_DB", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+atexit.register(shutil.rmtree, TMP, ignore_errors=True)
@@ -0,0 +1,81 @@
+# Qrauts AG Themensammler – archive_sync gegen einen lokalen Ersatz für GitHub (http.server)
+import os, json, threading, unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from support import TMP
+import db, archive_sync
+
+ETAG = '"archiv-v1"'
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """Serves one file like raw.githubusercontent.com: ETag on 200, 304 on a matching If-None-Match."""
+    body = b""
+    downloads = 0
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        type(self).downloads += 1
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+def archive_workbook() -> bytes:
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(db.ARCHIVE_EXPORT_COLS)
+    ws.append([1, "Altes Thema", "aus dem GitHub-Archiv", None, "Gerd", "2024-01-02 10:00", "2024-03-04 12:00", "[]"])
+    ws.append([2, "Noch ein Thema", "", None, "Marek", "2024-02-01 09:30", "2024-03-05 08:00",
+               '[{"label": "Doku", "url": "https://example.org"}]'])
+    path = os.path.join(TMP, "upstream.xlsx")
+    wb.save(path)
+    with open(path, "rb") as fh:
+        return fh.read()
+
+class SyncArchiveTest(unittest.TestCase):
+    def setUp(self):
+        ArchiveHandler.body = archive_workbook()
+        ArchiveHandler.downloads = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/archiv.xlsx"
+        self.target = os.path.join(TMP, "archiv.xlsx")
+        self.imports = 0
+        real_import = archive_sync.import_excel
+
+        def counting_import(*args, **kwargs):
+            self.imports += 1
+            return real_import(*args, **kwargs)
+        archive_sync.import_excel = counting_import
+        self.addCleanup(setattr, archive_sync, "import_excel", real_import)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def archived(self) -> int:
+        return db.get_conn().execute("SELECT COUNT(*) FROM cold.topics").fetchone()[0]
+
+    def test_unchanged_file_is_neither_downloaded_nor_imported_again(self):
+        before = self.archived()
+        first = archive_sync.sync_archive(self.url, self.target)
+        self.assertTrue(first["changed"])
+        self.assertEqual(first["import"]["imported"], 2)
+        self.assertEqual(json.loads(db.get_setting(archive_sync.SYNC_STATE_KEY))["etag"], ETAG)
+        self.assertEqual((ArchiveHandler.downloads, self.imports, self.archived() - before), (1, 1, 2))
+
+        second = archive_sync.sync_archive(self.url, self.target)
+        self.assertEqual(second, {"changed": False, "bytes": 0, "import": None})
+        self.assertEqual((ArchiveHandler.downloads, self.imports, self.archived() - before), (1, 1, 2))
+
+if __name__ == "__main__":
+    unittest.main()
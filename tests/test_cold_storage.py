@@ -0,0 +1,74 @@
+# Qrauts AG Themensammler – Verschieben zwischen Aktiv- und Archivdatenbank nach Abbrüchen
+import unittest
+
+from support import TMP  # noqa: F401 (sets up the test database)
+import db, snapshot
+
+class InterruptedMoveTest(unittest.TestCase):
+    def setUp(self):
+        db.create_topic("Wärmepumpe Quartier", "Pilot mit Erdsonden", None, "Gerd", [])
+        self.tid = db.get_conn().execute("SELECT MAX(id) FROM main.topics").fetchone()[0]
+        db.add_update(self.tid, "Marek", "Angebot liegt vor")
+        db.add_comment(self.tid, "Gerd", "Erdsonden prüfen")
+
+    def stores(self) -> list[str]:
+        return [s for s in db.STORES if db.get_conn().execute(f"SELECT 1 FROM {s}.topics WHERE id=?", (self.tid,)).fetchone()]
+
+    def assert_consistent(self):
+        """FTS indexes and summary tables of both files match their rows."""
+        conn = db.get_conn()
+        for s in db.STORES:
+            for fts in ("topics_fts", "updates_fts", "comments_fts"):
+                conn.execute(f"INSERT INTO {s}.{fts}({fts}, rank) VALUES('integrity-check', 1)")
+        counts = {s: conn.execute(f"SELECT dim, key, n FROM {s}.topic_counts WHERE n <> 0 ORDER BY 1, 2").fetchall() for s in db.STORES}
+        activity = {s: conn.execute(f"SELECT * FROM {s}.topic_activity ORDER BY 1").fetchall() for s in db.STORES}
+        conn.execute("SAVEPOINT rebuild")
+        for s in db.STORES:
+            db._rebuild_stats(conn, s)
+        self.assertEqual(counts, {s: conn.execute(f"SELECT dim, key, n FROM {s}.topic_counts WHERE n <> 0 ORDER BY 1, 2").fetchall() for s in db.STORES})
+        self.assertEqual(activity, {s: conn.execute(f"SELECT * FROM {s}.topic_activity ORDER BY 1").fetchall() for s in db.STORES})
+        conn.execute("ROLLBACK TO rebuild")
+        conn.execute("RELEASE rebuild")
+
+    def test_crash_between_copy_and_settle_of_archiving(self):
+        with db.transaction() as conn:  # archive_topic up to its first commit
+            conn.execute("UPDATE main.topics SET archived_at=? WHERE id=?", (db.now_iso(), self.tid))
+            db._copy(conn, [self.tid], "main", "cold")
+        self.assertEqual(self.stores(), ["main", "cold"])
+        db.sweep_archived()
+        self.assertEqual(self.stores(), ["cold"])
+        self.assert_consistent()
+        self.assertEqual([r[0] for r in db.get_conn().execute("SELECT rowid FROM cold.topics_fts WHERE topics_fts MATCH 'Erdsonden'")],
+                         [self.tid])
+
+    def test_crash_between_copy_and_settle_of_restoring(self):
+        db.archive_topic(self.tid, "Gerd")
+        with db.transaction() as conn:  # restore_topic up to its first commit
+            db._copy(conn, [self.tid], "cold", "main")
+            conn.execute("UPDATE main.topics SET archived_at=NULL WHERE id=?", (self.tid,))
+        db.add_update(self.tid, "Marek", "nach dem Wiederherstellen")
+        db.restore_topic(self.tid)  # clicked again: must not bring back the stale archived copy
+        db.sweep_archived()
+        self.assertEqual(self.stores(), ["main"])
+        self.assertEqual(db.get_conn().execute("SELECT COUNT(*) FROM main.updates WHERE topic_id=?", (self.tid,)).fetchone()[0], 2)
+        self.assert_consistent()
+
+    def test_snapshot_read_between_copy_and_settle(self):
+        snap = snapshot.TopicSnapshot()
+        snap.columns()
+        with db.transaction() as conn:  # archive_topic up to its first commit
+            conn.execute("UPDATE main.topics SET archived_at=? WHERE id=?", (db.now_iso(), self.tid))
+            db._copy(conn, [self.tid], "main", "cold")
+        cols = snap.columns()  # the topic is in both files now
+        self.assertEqual(cols.cold[cols.ids == self.tid].tolist(), [True])
+        seq = db.change_seq()
+        with db.transaction() as conn:
+            db._settle(conn, [self.tid])
+        self.assertGreater(db.change_seq(), seq)  # API ETags and the snapshot see the settle
+        cols = snap.columns()
+        self.assertEqual(cols.cold[cols.ids == self.tid].tolist(), [True])
+        self.assertNotIn(self.tid, snap.select({})[0].tolist())
+        self.assertIn(self.tid, snap.select({"archived_only": True})[0].tolist())
+
+if __name__ == "__main__":
+    unittest.main()